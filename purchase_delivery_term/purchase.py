@@ -25,6 +25,10 @@ from openerp.tools.translate import _
 import openerp.addons.decimal_precision as dp
 from datetime import datetime, timedelta
 from openerp.tools import DEFAULT_SERVER_DATE_FORMAT
+from openerp.tools.float_utils import float_compare
+
+# number of detailed lines given to one write of their purchase order
+EXPLOSION_BATCH_SIZE = 1000
 
 
 class purchase_delivery_term(orm.Model):
@@ -140,13 +144,12 @@ class purchase_order_line_master(orm.Model):
         'product_qty': 1.0,
     }
 
-    def _prepare_order_line(self, cr, uid, term_line, master_line,
-                            group_index=0, context=None):
+    def _onchange_order_line_values(self, cr, uid, master_line,
+                                    context=None):
+        """Values given by the product onchange of purchase.order.line for
+        the detailed lines of a master line. They are the same for all its
+        delivery term lines."""
         order_line_pool = self.pool.get('purchase.order.line')
-        group_pool = self.pool.get('purchase.order.line.group')
-        group_ids = group_pool.search(cr, uid, [])
-        product_qty = master_line.product_qty * term_line.quantity_perc
-        order_line_vals = {}
         on_change_res = order_line_pool.onchange_product_id(
             cr, uid, [],
             master_line.order_id.pricelist_id.id,
@@ -158,7 +161,23 @@ class purchase_order_line_master(orm.Model):
             date_planned=master_line.date_planned,
             name=master_line.name, price_unit=master_line.price_unit,
             context=context)
-        order_line_vals.update(on_change_res['value'])
+        return on_change_res['value']
+
+    def _prepare_order_line(self, cr, uid, term_line, master_line,
+                            group_index=0, context=None,
+                            onchange_values=None, group_ids=None):
+        """Values of the detailed line of a master line for a delivery term
+        line. onchange_values and group_ids can be given when they are
+        already known, to avoid computing them again for every term line."""
+        if group_ids is None:
+            group_pool = self.pool.get('purchase.order.line.group')
+            group_ids = group_pool.search(cr, uid, [])
+        if onchange_values is None:
+            onchange_values = self._onchange_order_line_values(
+                cr, uid, master_line, context=context)
+        product_qty = master_line.product_qty * term_line.quantity_perc
+        order_line_vals = {}
+        order_line_vals.update(onchange_values)
         date_planned = datetime.strptime(
             master_line.date_planned, DEFAULT_SERVER_DATE_FORMAT
         ) + timedelta(term_line.delay)
@@ -178,36 +197,131 @@ class purchase_order_line_master(orm.Model):
         })
         return order_line_vals
 
-    def generate_detailed_lines(self, cr, uid, ids, context=None):
-        group_pool = self.pool.get('purchase.order.line.group')
-        order_line_pool = self.pool.get('purchase.order.line')
-        group_ids = group_pool.search(cr, uid, [])
-        for master_line in self.browse(cr, uid, ids):
-            if master_line.order_line_ids:
+    def _read_term_schedules(self, cr, uid, term_ids, context=None):
+        """Return {term_id: [term_line]} with the lines of the delivery terms
+        in their order, found with one query and browsed together"""
+        schedules = dict((term_id, []) for term_id in term_ids)
+        if not term_ids:
+            return schedules
+        cr.execute("""
+            SELECT id
+            FROM purchase_delivery_term_line
+            WHERE term_id IN %s
+            ORDER BY term_id, id
+        """, (tuple(term_ids),))
+        term_line_ids = [row[0] for row in cr.fetchall()]
+        term_line_pool = self.pool.get('purchase.delivery.term.line')
+        for term_line in term_line_pool.browse(cr, uid, term_line_ids,
+                                               context=context):
+            schedules[term_line.term_id.id].append(term_line)
+        return schedules
+
+    def _check_explosion(self, cr, uid, master_lines, schedules, group_ids,
+                         context=None):
+        """Check that the detailed lines of the master lines can be
+        generated, with one query for the lines already generated"""
+        cr.execute("""
+            SELECT DISTINCT master_line_id
+            FROM purchase_order_line
+            WHERE master_line_id IN %s
+        """, (tuple(master_line.id for master_line in master_lines),))
+        generated_ids = set(row[0] for row in cr.fetchall())
+        for master_line in master_lines:
+            if master_line.id in generated_ids:
                 raise orm.except_orm(
                     _('Error'),
                     _("Detailed lines generated yet (for master line '%s'). "
                       "Remove them first") % master_line.name)
-            if len(master_line.delivery_term_id.line_ids) > len(group_ids):
+        for term in set(master_line.delivery_term_id
+                        for master_line in master_lines):
+            schedule = schedules[term.id]
+            if len(schedule) > len(group_ids):
                 raise orm.except_orm(
                     _('Error'),
                     _("Delivery term lines are %d. Order line groups are %d. "
                       "Please create more groups")
-                    % (len(master_line.delivery_term_id.line_ids),
-                       len(group_ids)))
-            if not master_line.delivery_term_id.is_total_percentage_correct():
+                    % (len(schedule), len(group_ids)))
+            total = 0.0
+            for term_line in schedule:
+                total += term_line.quantity_perc
+            if total != 1:
                 raise orm.except_orm(
                     _('Error'),
                     _("Total percentage of delivery term %s is not equal to 1")
-                    % master_line.delivery_term_id.name)
-            for group_index, term_line in enumerate(
-                master_line.delivery_term_id.line_ids
-            ):
-                order_line_vals = self._prepare_order_line(
+                    % term.name)
+
+    def _explode_schedule(self, cr, uid, master_lines, schedules, group_ids,
+                          context=None):
+        """Yield the values of the detailed lines of the master lines.
+
+        All the master lines are handled in one pass over the delivery term
+        lines read by _read_term_schedules. The values are built by
+        _prepare_order_line, with the product onchange evaluated once per
+        master line.
+        """
+        for master_line in master_lines:
+            onchange_values = self._onchange_order_line_values(
+                cr, uid, master_line, context=context)
+            schedule = schedules[master_line.delivery_term_id.id]
+            for group_index, term_line in enumerate(schedule):
+                yield self._prepare_order_line(
                     cr, uid, term_line, master_line, group_index=group_index,
-                    context=context)
-                order_line_pool.create(cr, uid, order_line_vals,
-                                       context=context)
+                    context=context, onchange_values=onchange_values,
+                    group_ids=group_ids)
+
+    def _create_order_lines(self, cr, uid, order_lines_vals,
+                            batch_size=EXPLOSION_BATCH_SIZE, context=None):
+        """Create detailed lines from an iterable of values.
+
+        The lines are created by the ORM, so the overrides of create and the
+        defaults of purchase.order.line apply. They are given to their order
+        as (0, 0, values) commands, with one write per order and batch of
+        batch_size lines: the stored amounts of an order are then computed
+        once per batch instead of after every line, and the values of at
+        most batch_size lines are held in memory.
+
+        Return the number of created lines.
+        """
+        order_pool = self.pool.get('purchase.order')
+
+        def flush(by_order):
+            for order_id, commands in by_order.iteritems():
+                order_pool.write(cr, uid, [order_id],
+                                 {'order_line': commands}, context=context)
+
+        by_order = {}
+        count = 0
+        for vals in order_lines_vals:
+            vals = dict(vals)
+            order_id = vals.pop('order_id')
+            by_order.setdefault(order_id, []).append((0, 0, vals))
+            count += 1
+            if not count % batch_size:
+                flush(by_order)
+                by_order = {}
+        flush(by_order)
+        return count
+
+    def generate_detailed_lines(self, cr, uid, ids, context=None):
+        if isinstance(ids, (int, long)):
+            ids = [ids]
+        if not ids:
+            return True
+        group_pool = self.pool.get('purchase.order.line.group')
+        group_ids = group_pool.search(cr, uid, [])
+        master_lines = self.browse(cr, uid, ids, context=context)
+        schedules = self._read_term_schedules(
+            cr, uid,
+            list(set(master_line.delivery_term_id.id
+                     for master_line in master_lines)),
+            context=context)
+        self._check_explosion(cr, uid, master_lines, schedules, group_ids,
+                              context=context)
+        self._create_order_lines(
+            cr, uid,
+            self._explode_schedule(cr, uid, master_lines, schedules,
+                                   group_ids, context=context),
+            context=context)
         return True
 
     def copy_data(self, cr, uid, id, default=None, context=None):
@@ -220,15 +334,28 @@ class purchase_order_line_master(orm.Model):
             cr, uid, id, default, context=context)
 
     def check_master_line_total(self, cr, uid, ids, context=None):
-        for master_line in self.browse(cr, uid, ids, context):
-            master_qty = master_line.product_qty
-            total_qty = 0.0
-            for order_line in master_line.order_line_ids:
-                total_qty += order_line.product_qty
-            if master_qty != total_qty:
+        """Check that the detailed lines of each master line sum up to its
+        quantity, with one grouped query for all the master lines"""
+        if isinstance(ids, (int, long)):
+            ids = [ids]
+        if not ids:
+            return True
+        cr.execute("""
+            SELECT m.product_qty, COALESCE(SUM(l.product_qty), 0.0)
+            FROM purchase_order_line_master m
+            LEFT JOIN purchase_order_line l ON l.master_line_id = m.id
+            WHERE m.id IN %s
+            GROUP BY m.id, m.product_qty
+        """, (tuple(ids),))
+        precision = self.pool.get('decimal.precision').precision_get(
+            cr, uid, 'Product Unit of Measure')
+        for master_qty, total_qty in cr.fetchall():
+            if float_compare(master_qty, total_qty,
+                             precision_digits=precision):
                 raise orm.except_orm(_('Error'), _(
                     'Order lines total quantity %s is different from master '
                     'line quantity %s') % (total_qty, master_qty))
+        return True
 
 
 class purchase_order_line(orm.Model):
@@ -264,15 +391,19 @@ class purchase_order(orm.Model):
         return super(purchase_order, self).copy(
             cr, uid, id, default, context=context)
 
+    def _master_line_ids(self, cr, uid, ids, context=None):
+        return self.pool.get('purchase.order.line.master').search(
+            cr, uid, [('order_id', 'in', ids)], context=context)
+
     def generate_detailed_lines(self, cr, uid, ids, context=None):
-        for order in self.browse(cr, uid, ids, context):
-            for master_line in order.master_order_line:
-                master_line.generate_detailed_lines()
+        self.pool.get('purchase.order.line.master').generate_detailed_lines(
+            cr, uid, self._master_line_ids(cr, uid, ids, context=context),
+            context=context)
         return True
 
     def wkf_approve_order(self, cr, uid, ids, context=None):
-        for order in self.browse(cr, uid, ids, context):
-            for master_line in order.master_order_line:
-                master_line.check_master_line_total()
+        self.pool.get('purchase.order.line.master').check_master_line_total(
+            cr, uid, self._master_line_ids(cr, uid, ids, context=context),
+            context=context)
         return super(purchase_order, self).wkf_approve_order(
             cr, uid, ids, context=context)
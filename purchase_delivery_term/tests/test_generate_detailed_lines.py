@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+from datetime import datetime, timedelta
+
+from openerp.osv import orm
+from openerp.tests import common
+from openerp.tools import DEFAULT_SERVER_DATE_FORMAT
+
+
+class TestGenerateDetailedLines(common.TransactionCase):
+
+    def setUp(self):
+        super(TestGenerateDetailedLines, self).setUp()
+        cr, uid = self.cr, self.uid
+        self.order_pool = self.registry('purchase.order')
+        self.master_pool = self.registry('purchase.order.line.master')
+        self.line_pool = self.registry('purchase.order.line')
+        group_pool = self.registry('purchase.order.line.group')
+        for name in ('First delivery', 'Second delivery'):
+            group_pool.create(cr, uid, {'name': name})
+        self.group_ids = group_pool.search(cr, uid, [])
+        term_id = self.registry('purchase.delivery.term').create(cr, uid, {
+            'name': 'Two deliveries',
+            'line_ids': [(0, 0, {'quantity_perc': 0.25, 'delay': 0}),
+                         (0, 0, {'quantity_perc': 0.75, 'delay': 30})],
+        })
+        master_values = {
+            'name': 'Master line',
+            'product_id': self.ref('product.product_product_4'),
+            'product_uom': self.ref('product.product_uom_unit'),
+            'price_unit': 10.0,
+            'delivery_term_id': term_id,
+        }
+        self.order_id = self.order_pool.create(cr, uid, {
+            'partner_id': self.ref('base.res_partner_1'),
+            'location_id': self.ref('stock.stock_location_stock'),
+            'pricelist_id': self.ref('purchase.list0'),
+            'master_order_line': [
+                (0, 0, dict(master_values, product_qty=8.0,
+                            date_planned='2015-01-10')),
+                (0, 0, dict(master_values, product_qty=20.0,
+                            date_planned='2015-02-28')),
+            ],
+        })
+
+    def expected_lines(self):
+        """Quantities, dates and groups of the detailed lines, computed like
+        generate_detailed_lines did one term line at a time"""
+        order = self.order_pool.browse(self.cr, self.uid, self.order_id)
+        expected = []
+        for master_line in order.master_order_line:
+            term_lines = master_line.delivery_term_id.line_ids
+            for group_index, term_line in enumerate(term_lines):
+                date_planned = datetime.strptime(
+                    master_line.date_planned, DEFAULT_SERVER_DATE_FORMAT
+                ) + timedelta(term_line.delay)
+                expected.append((
+                    master_line.id,
+                    master_line.product_qty * term_line.quantity_perc,
+                    date_planned.strftime(DEFAULT_SERVER_DATE_FORMAT),
+                    self.group_ids[group_index],
+                ))
+        return sorted(expected)
+
+    def generated_lines(self):
+        line_ids = self.line_pool.search(
+            self.cr, self.uid, [('order_id', '=', self.order_id)])
+        return sorted(
+            (line.master_line_id.id, line.product_qty,
+             line.date_planned[:10], line.picking_group_id.id)
+            for line in self.line_pool.browse(self.cr, self.uid, line_ids))
+
+    def test_generate_detailed_lines(self):
+        """ The detailed lines match those generated term line by term line
+        """
+        self.order_pool.generate_detailed_lines(self.cr, self.uid,
+                                                [self.order_id])
+        self.assertEqual(self.generated_lines(), self.expected_lines())
+
+    def test_generate_twice(self):
+        """ The detailed lines cannot be generated twice
+        """
+        self.order_pool.generate_detailed_lines(self.cr, self.uid,
+                                                [self.order_id])
+        with self.assertRaises(orm.except_orm):
+            self.order_pool.generate_detailed_lines(self.cr, self.uid,
+                                                    [self.order_id])
+
+    def test_check_master_line_total(self):
+        """ The detailed lines must sum up to the quantity of their master
+        line
+        """
+        cr, uid = self.cr, self.uid
+        self.order_pool.generate_detailed_lines(cr, uid, [self.order_id])
+        master_ids = self.master_pool.search(
+            cr, uid, [('order_id', '=', self.order_id)])
+        self.assertTrue(
+            self.master_pool.check_master_line_total(cr, uid, master_ids))
+        line_id = self.line_pool.search(
+            cr, uid, [('master_line_id', '=', master_ids[0])], limit=1)[0]
+        self.line_pool.write(cr, uid, [line_id], {'product_qty': 1.0})
+        with self.assertRaises(orm.except_orm):
+            self.master_pool.check_master_line_total(cr, uid, master_ids)
@@ -36,9 +36,13 @@
  Therefore, this module reimplements the feature, with the same basic result
  in the standard case. Hooks are provided for extra modules that add fields
  or change the logic.
+
+ A scheduled action (inactive by default) merges automatically the draft
+ orders created or changed since its previous run, for example the ones
+ generated by procurements.
  """,
  'website': 'http://www.camptocamp.com/',
- 'data': [],
+ 'data': ['purchase_group_hooks_data.xml'],
  'installable': False,
  'auto_install': False,
  'license': 'AGPL-3',
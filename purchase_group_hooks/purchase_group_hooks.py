@@ -19,14 +19,46 @@
 #
 ##############################################################################
 
+import logging
+import time
+from datetime import datetime, timedelta
+
+from psycopg2 import OperationalError, errorcodes
+
+from openerp import SUPERUSER_ID
 from openerp.osv.orm import Model
-from openerp import netsvc
+from openerp.osv import fields
 from openerp.osv.orm import browse_record, browse_null
+from openerp.tools import DEFAULT_SERVER_DATETIME_FORMAT
+
+_logger = logging.getLogger(__name__)
+
+AUTO_MERGE_WATERMARK = 'purchase_group_hooks.auto_merge_watermark'
+# minutes the watermark of the automatic merge is set back
+AUTO_MERGE_OVERLAP = 10
+BULK_INSERT_SIZE = 1000
+MERGE_JOB_TRIES = 5
+RETRY_PGCODES = (errorcodes.SERIALIZATION_FAILURE,
+                 errorcodes.DEADLOCK_DETECTED)
 
 
 class PurchaseOrder(Model):
     _inherit = 'purchase.order'
 
+    def _auto_init(self, cr, context=None):
+        """Index write_date, used by the scheduler to find changed drafts."""
+        res = super(PurchaseOrder, self)._auto_init(cr, context=context)
+        cr.execute("""
+            SELECT indexname FROM pg_indexes
+            WHERE indexname = 'purchase_order_state_write_date_index'
+        """)
+        if not cr.fetchone():
+            cr.execute("""
+                CREATE INDEX purchase_order_state_write_date_index
+                ON purchase_order (state, write_date)
+            """)
+        return res
+
     def _key_fields_for_grouping(self):
         """Return a list of fields used to identify orders that can be merged.
 
@@ -108,11 +140,100 @@ class PurchaseOrder(Model):
                 )
         return merged_data
 
-    def _group_orders(self, input_orders):
+    def _make_key_for_grouping_from_values(self, values, fields):
+        """Same as _make_key_for_grouping, but from the result of a read.
+
+        The values are expected to come from a read done with
+        load='_classic_write', so that many2one fields are plain ids.
+        """
+        key_list = []
+        for field in fields:
+            field_value = values[field]
+            if field_value is None:
+                field_value = False
+            elif isinstance(field_value, list):
+                field_value = ((6, 0, tuple(field_value)),)
+            key_list.append((field, field_value))
+        key_list.sort()
+        return tuple(key_list)
+
+    def _lines_data_for_grouping(self, order):
+        """Return the grouping data of the lines of a browsed order.
+
+        The result is a list of tuples in the form:
+
+        (line_key, product_qty, product_uom_id, uom_factor)
+
+        """
+        line_key_fields = self._key_fields_for_grouping_lines()
+        lines_data = []
+        for input_line in order.order_line:
+            lines_data.append((
+                self._make_key_for_grouping(input_line, line_key_fields),
+                input_line.product_qty,
+                input_line.product_uom.id if input_line.product_uom else False,
+                input_line.product_uom.factor
+                if input_line.product_uom
+                else 1.0,
+            ))
+        return lines_data
+
+    def _read_lines_for_grouping(self, cr, uid, order_ids, context=None):
+        """Read the grouping data of the lines of many orders at once.
+
+        Instead of browsing every line and its unit of measure, the lines of
+        all the orders are read in one go, and so are their units of measure.
+
+        Return a dictionary in the form:
+
+        order_id: [(line_key, product_qty, product_uom_id, uom_factor), ...]
+
+        """
+        line_obj = self.pool.get('purchase.order.line')
+        uom_obj = self.pool.get('product.uom')
+        line_key_fields = self._key_fields_for_grouping_lines()
+
+        lines_by_order = dict((order_id, []) for order_id in order_ids)
+        if not order_ids:
+            return lines_by_order
+
+        line_ids = line_obj.search(cr, uid,
+                                   [('order_id', 'in', list(order_ids))],
+                                   context=context)
+        read_fields = list(set(line_key_fields) |
+                           set(['order_id', 'product_qty', 'product_uom']))
+        lines = line_obj.read(cr, uid, line_ids, read_fields,
+                              context=context, load='_classic_write')
+
+        uom_ids = list(set(line['product_uom'] for line in lines
+                           if line['product_uom']))
+        uom_factors = dict(
+            (uom['id'], uom['factor'])
+            for uom in uom_obj.read(cr, uid, uom_ids, ['factor'],
+                                    context=context)
+        )
+
+        # read does not keep the order of the ids, search does
+        lines_by_id = dict((line['id'], line) for line in lines)
+        for line_id in line_ids:
+            line = lines_by_id[line_id]
+            lines_by_order[line['order_id']].append((
+                self._make_key_for_grouping_from_values(line,
+                                                        line_key_fields),
+                line['product_qty'],
+                line['product_uom'],
+                uom_factors.get(line['product_uom'], 1.0),
+            ))
+        return lines_by_order
+
+    def _group_orders(self, input_orders, lines_by_order=None):
         """Return a dictionary where each element is in the form:
 
         tuple_key: (dict_of_new_order_data, list_of_old_order_ids)
 
+        The lines are taken from lines_by_order when given (see
+        _read_lines_for_grouping), otherwise they are browsed order by order.
+
         """
         key_fields = self._key_fields_for_grouping()
         grouped_orders = {}
@@ -137,32 +258,25 @@ class PurchaseOrder(Model):
                 )
             grouped_order_data = grouped_orders[key][0]
 
-            for input_line in input_order.order_line:
-                line_key = self._make_key_for_grouping(
-                    input_line,
-                    self._key_fields_for_grouping_lines()
-                )
+            if lines_by_order is None:
+                lines_data = self._lines_data_for_grouping(input_order)
+            else:
+                lines_data = lines_by_order[input_order.id]
+
+            for line_key, product_qty, product_uom, uom_factor in lines_data:
                 o_line = grouped_order_data['order_line'].setdefault(
                     line_key, {}
                 )
                 if o_line:
                     # merge the line with an existing line
                     o_line['product_qty'] += (
-                        input_line.product_qty *
-                        input_line.product_uom.factor /
-                        o_line['uom_factor']
+                        product_qty * uom_factor / o_line['uom_factor']
                     )
                 else:
                     # append a new "standalone" line
-                    for field in ('product_qty', 'product_uom'):
-                        field_val = getattr(input_line, field)
-                        if isinstance(field_val, browse_record):
-                            field_val = field_val.id
-                        o_line[field] = field_val
-                    o_line['uom_factor'] = (
-                        input_line.product_uom.factor
-                        if input_line.product_uom
-                        else 1.0)
+                    o_line['product_qty'] = product_qty
+                    o_line['product_uom'] = product_uom
+                    o_line['uom_factor'] = uom_factor
 
         return self._cleanup_merged_line_data(grouped_orders)
 
@@ -197,20 +311,159 @@ class PurchaseOrder(Model):
             new_old_rel[new_id] = old_order_ids
         return new_old_rel
 
+    def _create_new_orders_bulk(self, cr, uid, grouped_orders, context=None):
+        """Bulk variant of _create_new_orders.
+
+        The headers are created without their lines, then the lines of all
+        the orders are inserted together by purchase.order.line's
+        _bulk_create, which computes the stored fields once for the batch.
+        The create overrides of purchase.order.line are not called, see
+        do_merge.
+
+        Return the same dictionary as _create_new_orders.
+
+        """
+        line_obj = self.pool.get('purchase.order.line')
+        new_old_rel = {}
+        lines_values = []
+        for key in grouped_orders:
+            new_order_data, old_order_ids = grouped_orders[key]
+            header_data = dict(new_order_data)
+            order_lines = header_data.pop('order_line')
+            new_id = self.create(cr, uid, header_data, context=context)
+            new_old_rel[new_id] = old_order_ids
+            for __, __, line_values in order_lines:
+                line_values = dict(line_values, order_id=new_id)
+                lines_values.append(line_values)
+        line_obj._bulk_create(cr, uid, lines_values, context=context)
+        return new_old_rel
+
     def _fix_workflow(self, cr, uid, new_old_rel):
         """Fix the workflow of the old and new orders.
 
         Specifically, cancel the old ones and assign workflows to the new ones.
 
+        The workflows waiting on the old orders are redirected to the new
+        ones in a single query, then the old orders are cancelled all
+        together by _cancel_workflows.
+
+        """
+        old_new_ids = [
+            (old_id, new_order_id)
+            for new_order_id, old_order_ids in new_old_rel.iteritems()
+            for old_id in old_order_ids
+        ]
+        self._redirect_workflows(cr, old_new_ids)
+        self._cancel_workflows(cr, uid, [old_id for old_id, __
+                                         in old_new_ids])
+
+    def _cancel_workflows(self, cr, uid, order_ids, context=None):
+        """Cancel draft orders with grouped workflow operations.
+
+        This does what the purchase_cancel signal does order by order: the
+        workflow instances of the orders are moved to the cancel activity
+        with a few queries, which stops them, then the action of the cancel
+        activity, wkf_action_cancel, runs once for all the orders.
+
+        """
+        if not order_ids:
+            return
+        cancel_act_id = self.pool.get('ir.model.data').get_object_reference(
+            cr, uid, 'purchase', 'act_cancel')[1]
+        cr.execute("""
+            SELECT id FROM wkf_instance
+            WHERE res_type = %s
+              AND res_id IN %s
+              AND state = 'active'
+        """, (self._name, tuple(order_ids)))
+        inst_ids = tuple(row[0] for row in cr.fetchall())
+        if inst_ids:
+            cr.execute("DELETE FROM wkf_workitem WHERE inst_id IN %s",
+                       (inst_ids,))
+            cr.execute("""
+                INSERT INTO wkf_workitem (act_id, inst_id, state)
+                SELECT %s, id, 'complete' FROM wkf_instance WHERE id IN %s
+            """, (cancel_act_id, inst_ids))
+            cr.execute("""
+                UPDATE wkf_instance SET state = 'complete' WHERE id IN %s
+            """, (inst_ids,))
+        self.wkf_action_cancel(cr, uid, list(order_ids), context=context)
+
+    def _redirect_workflows(self, cr, old_new_ids):
+        """Redirect to the new orders the workflows waiting on the old ones.
+
+        This does what trg_redirect does, but for all the orders in a single
+        query. old_new_ids is a list of (old_order_id, new_order_id) pairs.
+
+        """
+        if not old_new_ids:
+            return
+        old_ids, new_ids = zip(*old_new_ids)
+        cr.execute("""
+            UPDATE wkf_workitem
+            SET subflow_id = new_inst.id
+            FROM wkf_instance old_inst,
+                 wkf_instance new_inst,
+                 (SELECT unnest(%s) AS old_id,
+                         unnest(%s) AS new_id) rel
+            WHERE wkf_workitem.subflow_id = old_inst.id
+              AND old_inst.res_type = %s
+              AND old_inst.res_id = rel.old_id
+              AND new_inst.res_type = %s
+              AND new_inst.res_id = rel.new_id
+              AND new_inst.wkf_id = old_inst.wkf_id
+              AND new_inst.state = 'active'
+        """, (list(old_ids), list(new_ids), self._name, self._name))
+
+    def _grouped_orders_for_merge(self, cr, uid, input_order_ids,
+                                  context=None):
+        """Group the mergeable orders among the given ones.
+
+        Return the result of _group_orders.
+        """
+        input_orders = self.browse(cr, uid, input_order_ids, context=context)
+        mergeable_orders = filter(self._can_merge, input_orders)
+        lines_by_order = self._read_lines_for_grouping(
+            cr, uid, [order.id for order in mergeable_orders], context=context)
+        return self._group_orders(mergeable_orders,
+                                  lines_by_order=lines_by_order)
+
+    def _plain_merged_value(self, value):
+        """Turn a (6, 0, ids) command of a merged line into a list of ids."""
+        if (
+            isinstance(value, tuple) and len(value) == 1 and
+            isinstance(value[0], tuple) and value[0][:2] == (6, 0)
+        ):
+            return list(value[0][2])
+        return value
+
+    def plan_merge(self, cr, uid, input_order_ids, context=None):
+        """Preview what do_merge would do, without writing anything.
+
+        Return a list of dictionaries, one per order that would be created,
+        with the keys:
+
+        * order_values: the values of the new order, without its lines
+        * lines: the values of the merged lines, with their quantities
+        * old_ids: the ids of the orders that would be merged and cancelled
+
         """
-        wf_service = netsvc.LocalService("workflow")
-        for new_order_id in new_old_rel:
-            old_order_ids = new_old_rel[new_order_id]
-            for old_id in old_order_ids:
-                wf_service.trg_redirect(uid, 'purchase.order', old_id,
-                                        new_order_id, cr)
-                wf_service.trg_validate(uid, 'purchase.order', old_id,
-                                        'purchase_cancel', cr)
+        grouped_orders = self._grouped_orders_for_merge(
+            cr, uid, input_order_ids, context=context)
+        plan = []
+        for order_data, old_ids in grouped_orders.itervalues():
+            order_values = dict(order_data)
+            lines = [
+                dict((field, self._plain_merged_value(value))
+                     for field, value in line_values.iteritems())
+                for __, __, line_values in order_values.pop('order_line')
+            ]
+            plan.append({
+                'order_values': order_values,
+                'lines': lines,
+                'old_ids': old_ids,
+            })
+        return plan
 
     def do_merge(self, cr, uid, input_order_ids, context=None):
         """Merge Purchase Orders.
@@ -225,12 +478,345 @@ class PurchaseOrder(Model):
 
         New orders are created, and old orders are deleted.
 
-        """
-        input_orders = self.browse(cr, uid, input_order_ids, context=context)
-        mergeable_orders = filter(self._can_merge, input_orders)
-        grouped_orders = self._group_orders(mergeable_orders)
+        With merge_bulk_create in the context, the new orders are created
+        with _create_new_orders_bulk, whose lines are inserted with raw SQL.
+        Only set it when no installed module overrides create on
+        purchase.order.line: the overrides are not called for the new lines,
+        and the defaults are computed once for all of them rather than line
+        by line. The constraints and the stored computed fields of the lines
+        and of their orders are still checked and computed.
 
-        new_old_rel = self._create_new_orders(cr, uid, grouped_orders,
-                                              context=context)
+        """
+        grouped_orders = self._grouped_orders_for_merge(
+            cr, uid, input_order_ids, context=context)
+
+        if context and context.get('merge_bulk_create'):
+            new_old_rel = self._create_new_orders_bulk(
+                cr, uid, grouped_orders, context=context)
+        else:
+            new_old_rel = self._create_new_orders(cr, uid, grouped_orders,
+                                                  context=context)
         self._fix_workflow(cr, uid, new_old_rel)
         return new_old_rel
+
+    def _auto_merge_domain(self, cr, uid, context=None):
+        """Return the domain of the orders the scheduler may merge.
+
+        This function can be extended by other modules to restrict it, for
+        example to the orders generated by procurements.
+        """
+        return [('state', '=', 'draft')]
+
+    def _auto_merge_chunks(self, candidate_orders, changed_ids, chunk_size):
+        """Group the candidate orders for the scheduler.
+
+        Only the groups that contain at least one changed order and that
+        have something to merge are kept. A group is never split across
+        chunks, but a chunk gathers groups up to chunk_size orders.
+
+        Return a list of lists of order ids.
+        """
+        key_fields = self._key_fields_for_grouping()
+        groups = {}
+        for order in candidate_orders:
+            if self._can_merge(order):
+                key = self._make_key_for_grouping(order, key_fields)
+                groups.setdefault(key, []).append(order.id)
+
+        chunks = []
+        current_chunk = []
+        changed_ids = set(changed_ids)
+        for key in sorted(groups):
+            order_ids = groups[key]
+            if len(order_ids) < 2 or not changed_ids.intersection(order_ids):
+                continue
+            if current_chunk and (
+                len(current_chunk) + len(order_ids) > chunk_size
+            ):
+                chunks.append(current_chunk)
+                current_chunk = []
+            current_chunk = current_chunk + order_ids
+        if current_chunk:
+            chunks.append(current_chunk)
+        return chunks
+
+    def run_auto_merge(self, cr, uid, chunk_size=100,
+                       overlap=AUTO_MERGE_OVERLAP, context=None):
+        """Merge the draft orders created or changed since the last run.
+
+        Called by the scheduler. The changed drafts are merged with the other
+        drafts that share their key, and each chunk of merges is committed in
+        its own transaction. The watermark is only moved once all the chunks
+        are done, so that a failed run is retried from the same point.
+
+        A draft written by a transaction that started before this run but
+        commits after its search gets a write date before the start of the
+        run. The watermark is therefore set overlap minutes before the start
+        of the run, so such drafts are found by the next run. Merging again
+        the drafts already seen is harmless: the merged ones are cancelled,
+        the others have nothing to be merged with.
+
+        Return the merged orders, in the same form as do_merge.
+        """
+        param_obj = self.pool.get('ir.config_parameter')
+        watermark = param_obj.get_param(cr, uid, AUTO_MERGE_WATERMARK)
+        cr.execute("SELECT (now() - interval '1 minute' * %s) "
+                   "AT TIME ZONE 'UTC'", (overlap,))
+        new_watermark = cr.fetchone()[0].strftime(
+            DEFAULT_SERVER_DATETIME_FORMAT)
+
+        domain = self._auto_merge_domain(cr, uid, context=context)
+        changed_domain = list(domain)
+        if watermark:
+            changed_domain += ['|',
+                               ('create_date', '>=', watermark),
+                               ('write_date', '>=', watermark)]
+        changed_ids = self.search(cr, uid, changed_domain, context=context)
+
+        new_old_rel = {}
+        if changed_ids:
+            partner_ids = list(set(
+                order['partner_id'] for order in self.read(
+                    cr, uid, changed_ids, ['partner_id'], context=context,
+                    load='_classic_write')
+            ))
+            candidate_ids = self.search(
+                cr, uid, domain + [('partner_id', 'in', partner_ids)],
+                context=context)
+            candidate_orders = self.browse(cr, uid, candidate_ids,
+                                           context=context)
+            chunks = self._auto_merge_chunks(candidate_orders, changed_ids,
+                                             chunk_size)
+            for chunk in chunks:
+                new_old_rel.update(
+                    self.do_merge(cr, uid, chunk, context=context))
+                cr.commit()
+            _logger.info('Automatic merge: %d draft orders changed, '
+                         '%d orders created in %d chunks.',
+                         len(changed_ids), len(new_old_rel), len(chunks))
+
+        param_obj.set_param(cr, uid, AUTO_MERGE_WATERMARK, new_watermark)
+        cr.commit()
+        return new_old_rel
+
+    def _partition_orders_for_merge(self, cr, uid, order_ids, context=None):
+        """Split the orders in partitions that can be merged independently.
+
+        The orders are partitioned by supplier, which is part of the merge
+        key. If a module removes the supplier from the key, everything goes
+        in a single partition.
+
+        Return a dictionary in the form:
+
+        partner_id: [order_1_id, order_2_id]
+
+        """
+        if 'partner_id' not in self._key_fields_for_grouping():
+            return {False: list(order_ids)}
+        partitions = {}
+        for order in self.read(cr, uid, order_ids, ['partner_id'],
+                               context=context, load='_classic_write'):
+            partitions.setdefault(order['partner_id'], []).append(order['id'])
+        return partitions
+
+    def _schedule_merge_job(self, cr, uid, order_ids, tries=0, delay=0,
+                            context=None):
+        """Create the one-shot scheduled action that merges a partition.
+
+        The scheduled actions can only be created by the administrators, so
+        it is created as superuser, and run as the current user.
+
+        Return the id of the scheduled action.
+        """
+        nextcall = (datetime.utcnow() + timedelta(minutes=delay)).strftime(
+            DEFAULT_SERVER_DATETIME_FORMAT)
+        return self.pool.get('ir.cron').create(cr, SUPERUSER_ID, {
+            'name': 'Merge purchase orders %s' % order_ids[:5],
+            'user_id': uid,
+            'model': self._name,
+            'function': 'run_merge_job',
+            'args': repr((order_ids, tries)),
+            'interval_number': 1,
+            'interval_type': 'minutes',
+            'numbercall': 1,
+            'doall': True,
+            'nextcall': nextcall,
+        }, context=context)
+
+    def _unlink_spent_merge_jobs(self, cr, uid, context=None):
+        """Delete the scheduled actions of the merge jobs that have run.
+
+        A one-shot scheduled action is only deactivated once run, and it
+        cannot delete itself while the scheduler holds a lock on it.
+        """
+        cron_obj = self.pool.get('ir.cron')
+        ctx = dict(context or {}, active_test=False)
+        spent_ids = cron_obj.search(cr, SUPERUSER_ID, [
+            ('model', '=', self._name),
+            ('function', '=', 'run_merge_job'),
+            ('active', '=', False),
+            ('numbercall', '=', 0),
+        ], context=ctx)
+        if spent_ids:
+            cron_obj.unlink(cr, SUPERUSER_ID, spent_ids, context=ctx)
+
+    def do_merge_parallel(self, cr, uid, input_order_ids, context=None):
+        """Merge Purchase Orders, one supplier per scheduled job.
+
+        A one-shot scheduled action is created for each supplier. The
+        scheduler workers run them concurrently, each in its own cursor and
+        transaction, with run_merge_job. The jobs are created in the current
+        transaction: they only start once it is committed, so they see the
+        orders as committed, and nothing runs if it is rolled back. The
+        scheduled actions of the jobs that have already run are deleted.
+
+        Return the ids of the scheduled actions.
+
+        """
+        self._unlink_spent_merge_jobs(cr, uid, context=context)
+        partitions = self._partition_orders_for_merge(cr, uid,
+                                                      input_order_ids,
+                                                      context=context)
+        return [self._schedule_merge_job(cr, uid, order_ids, context=context)
+                for order_ids in partitions.itervalues()]
+
+    def run_merge_job(self, cr, uid, order_ids, tries=0, context=None):
+        """Merge the orders of one partition. Called by the scheduler.
+
+        Orders merged or cancelled in the meantime are not mergeable any
+        more and are left out by do_merge. A job that fails on a
+        serialization error or a deadlock with a concurrent job is scheduled
+        again a few times, later and later.
+
+        Return a tuple (new_old_rel, elapsed), where new_old_rel is in the
+        same form as do_merge and elapsed is the duration of the merge in
+        seconds.
+        """
+        start = time.time()
+        order_ids = self.search(cr, uid, [('id', 'in', order_ids)],
+                                context=context)
+        try:
+            with cr.savepoint():
+                new_old_rel = self.do_merge(cr, uid, order_ids,
+                                            context=context)
+        except OperationalError as e:
+            tries += 1
+            if e.pgcode not in RETRY_PGCODES or tries >= MERGE_JOB_TRIES:
+                raise
+            _logger.info('Merge job of orders %s failed with %s, retrying '
+                         'in %d minutes.', order_ids,
+                         errorcodes.lookup(e.pgcode), 2 ** tries)
+            self._schedule_merge_job(cr, uid, order_ids, tries=tries,
+                                     delay=2 ** tries, context=context)
+            return {}, time.time() - start
+        elapsed = time.time() - start
+        _logger.info('Merge job: %d orders merged into %d in %.2fs.',
+                     len(order_ids), len(new_old_rel), elapsed)
+        return new_old_rel, elapsed
+
+
+class PurchaseOrderLine(Model):
+    _inherit = 'purchase.order.line'
+
+    def _bulk_create(self, cr, uid, vals_list, context=None):
+        """Create many lines with multi-row inserts.
+
+        The defaults are computed once for all the lines, the rows and the
+        many2many relations are inserted in batches, and the stored function
+        fields of the lines and of their orders are computed once at the end,
+        like create would do line by line.
+
+        This bypasses the create method: the overrides of create added by
+        other modules are not called, and the defaults are computed once
+        for the whole batch. It must only be used with values that create
+        would accept unchanged, when no override of create is needed. The
+        constraints are checked and the stored fields computed, both the
+        function fields and the new style computed and related fields.
+
+        Return the list of the ids of the created lines.
+        """
+        if not vals_list:
+            return []
+        self.check_access_rights(cr, uid, 'create')
+        columns = self._columns
+        all_fields = set()
+        for vals in vals_list:
+            all_fields.update(vals)
+        defaults = self.default_get(
+            cr, uid, [name for name in columns if name not in all_fields],
+            context=context)
+
+        stored_fields = sorted(
+            name for name in set(defaults) | all_fields
+            if name in columns and columns[name]._classic_write and
+            not isinstance(columns[name], fields.function)
+        )
+        m2m_fields = sorted(
+            name for name in set(defaults) | all_fields
+            if name in columns and
+            isinstance(columns[name], fields.many2many)
+        )
+
+        cr.execute("SELECT nextval(%s) FROM generate_series(1, %s)",
+                   (self._sequence, len(vals_list)))
+        ids = [row[0] for row in cr.fetchall()]
+
+        placeholder = '(%s, %s)' % (
+            '%s', ', '.join(
+                [columns[name]._symbol_set[0] for name in stored_fields] +
+                ["%s", "(now() at time zone 'UTC')"] * 2
+            ))
+        rows = []
+        relations = dict((name, []) for name in m2m_fields)
+        for new_id, vals in zip(ids, vals_list):
+            vals = dict(defaults, **vals)
+            row = [new_id]
+            for name in stored_fields:
+                row.append(columns[name]._symbol_set[1](vals.get(name)))
+            row += [uid, uid]
+            rows.append(row)
+            for name in m2m_fields:
+                for command in vals.get(name) or []:
+                    if command[0] == 6:
+                        relations[name] += [(new_id, rel_id)
+                                            for rel_id in command[2]]
+                    elif command[0] == 4:
+                        relations[name].append((new_id, command[1]))
+
+        query = 'INSERT INTO "%s" (id, %s) VALUES ' % (
+            self._table,
+            ', '.join('"%s"' % name for name in stored_fields +
+                      ['create_uid', 'create_date', 'write_uid', 'write_date'])
+        )
+        for start in xrange(0, len(rows), BULK_INSERT_SIZE):
+            chunk = rows[start:start + BULK_INSERT_SIZE]
+            cr.execute(query + ', '.join([placeholder] * len(chunk)),
+                       [value for row in chunk for value in row])
+
+        for name, pairs in relations.iteritems():
+            if not pairs:
+                continue
+            rel, id1, id2 = columns[name]._sql_names(self)
+            query = 'INSERT INTO "%s" ("%s", "%s") VALUES ' % (rel, id1, id2)
+            for start in xrange(0, len(pairs), BULK_INSERT_SIZE):
+                chunk = pairs[start:start + BULK_INSERT_SIZE]
+                cr.execute(query + ', '.join(['%s'] * len(chunk)), chunk)
+
+        # like create, mark the computed fields of the new lines and of
+        # the records depending on them, and check the constraints
+        lines = self.browse(cr, uid, ids, context=context)
+        lines.modified(self._fields)
+        lines._validate_fields(set(stored_fields + m2m_fields))
+
+        # compute the stored function fields once for the whole batch
+        done = []
+        for __, model_name, store_ids, store_fields in sorted(
+            self._store_get_values(cr, uid, ids,
+                                   stored_fields + m2m_fields, context)
+        ):
+            if (model_name, store_ids, store_fields) not in done:
+                self.pool.get(model_name)._store_set_values(
+                    cr, uid, store_ids, store_fields, context)
+                done.append((model_name, store_ids, store_fields))
+        lines.recompute()
+        return ids
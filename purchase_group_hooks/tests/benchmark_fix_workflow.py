@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    Author: Leonardo Pistone
+#    Copyright 2014 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+"""Compare _fix_workflow, which redirects and cancels the merged orders with
+grouped workflow operations, with a redirection and a purchase_cancel signal
+order by order, on many merged orders.
+
+This is not part of the test suite. Run it on a database where the module is
+installed with the demo data:
+
+    python benchmark_fix_workflow.py -c /path/to/openerp.cfg -d <database>
+
+All the records created by the benchmark are rolled back at the end.
+
+"""
+import sys
+import time
+
+import openerp
+from openerp import SUPERUSER_ID, netsvc
+from openerp.modules.registry import RegistryManager
+
+SIZES = (100, 1000, 10000)
+
+
+def create_drafts(cr, registry, count):
+    """Create draft orders that can all be merged together."""
+    order_obj = registry.get('purchase.order')
+    template_id = registry.get('ir.model.data').get_object_reference(
+        cr, SUPERUSER_ID, 'purchase', 'purchase_order_4')[1]
+    template = order_obj.browse(cr, SUPERUSER_ID, template_id)
+    line = template.order_line[0]
+    values = {
+        'partner_id': template.partner_id.id,
+        'location_id': template.location_id.id,
+        'pricelist_id': template.pricelist_id.id,
+        'order_line': [(0, 0, {
+            'name': line.name,
+            'product_id': line.product_id.id,
+            'product_qty': line.product_qty,
+            'product_uom': line.product_uom.id,
+            'price_unit': line.price_unit,
+            'date_planned': line.date_planned,
+        })],
+    }
+    return [order_obj.create(cr, SUPERUSER_ID, dict(values))
+            for __ in xrange(count)]
+
+
+def fix_one_by_one(order_obj, cr, uid, new_old_rel):
+    """Redirect and cancel the old orders one at a time."""
+    wf_service = netsvc.LocalService("workflow")
+    for new_order_id, old_order_ids in new_old_rel.iteritems():
+        for old_id in old_order_ids:
+            wf_service.trg_redirect(uid, 'purchase.order', old_id,
+                                    new_order_id, cr)
+            wf_service.trg_validate(uid, 'purchase.order', old_id,
+                                    'purchase_cancel', cr)
+
+
+def fix_workflow(order_obj, cr, uid, new_old_rel):
+    order_obj._fix_workflow(cr, uid, new_old_rel)
+
+
+def measure(cr, registry, count, fix):
+    """Merge count orders and time the given workflow fixing function."""
+    order_obj = registry.get('purchase.order')
+    old_ids = create_drafts(cr, registry, count)
+    new_id = create_drafts(cr, registry, 1)[0]
+
+    start = time.time()
+    fix(order_obj, cr, SUPERUSER_ID, {new_id: old_ids})
+    elapsed = time.time() - start
+
+    orders = order_obj.read(cr, SUPERUSER_ID, old_ids, ['state'])
+    assert all(order['state'] == 'cancel' for order in orders)
+    return elapsed
+
+
+def main(args):
+    openerp.tools.config.parse_config(args)
+    dbname = openerp.tools.config['db_name']
+    registry = RegistryManager.get(dbname)
+    cr = registry.db.cursor()
+    try:
+        print('%8s %16s %16s' % ('orders', 'one by one', '_fix_workflow'))
+        for count in SIZES:
+            per_order = measure(cr, registry, count, fix_one_by_one)
+            batch = measure(cr, registry, count, fix_workflow)
+            print('%8d %15.2fs %15.2fs' % (count, per_order, batch))
+    finally:
+        cr.rollback()
+        cr.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
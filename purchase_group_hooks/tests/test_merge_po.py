@@ -1,5 +1,9 @@
-from mock import Mock
+from datetime import datetime
 
+from mock import MagicMock, Mock, patch
+from psycopg2 import OperationalError, errorcodes
+
+from openerp import SUPERUSER_ID
 from openerp.tests.common import BaseCase
 from openerp.osv.orm import browse_record
 
@@ -74,3 +78,168 @@ class TestGroupOrders(BaseCase):
 
         self.assertEquals(merged_data['origin'], 'ORIGIN1 ORIGIN2')
         self.assertEquals(merged_data['notes'], 'Notes1\nNotes2')
+
+    def test_key_from_read_values(self):
+        """A key built from read values matches the one built on browse."""
+        line = Mock()
+        line.name = 'Line'
+        line.product_id = Mock(spec=browse_record, id=7)
+        line.taxes_id = [Mock(id=3), Mock(id=4)]
+
+        values = {'name': 'Line', 'product_id': 7, 'taxes_id': [3, 4]}
+        fields = ('name', 'product_id', 'taxes_id')
+
+        self.assertEquals(
+            self.po._make_key_for_grouping_from_values(values, fields),
+            self.po._make_key_for_grouping(line, fields))
+
+    def test_merge_prefetched_lines(self):
+        """Lines given as prefetched data are merged with their UoM factor."""
+        self.order1.partner_id = self.order2.partner_id = Mock(
+            spec=browse_record, id=1)
+        self.order1.location_id = self.order2.location_id = Mock(
+            spec=browse_record, id=2)
+        self.order1.pricelist_id = self.order2.pricelist_id = Mock(
+            spec=browse_record, id=3)
+
+        self.order1.id = 51
+        self.order2.id = 52
+
+        line_key = (('name', 'Line'), ('product_id', 7))
+        lines_by_order = {
+            51: [(line_key, 2.0, 10, 1.0)],
+            52: [(line_key, 3.0, 11, 0.5)],
+        }
+
+        grouped = self.po._group_orders([self.order1, self.order2],
+                                        lines_by_order=lines_by_order)
+
+        expected_key = (('location_id', 2), ('partner_id', 1),
+                        ('pricelist_id', 3))
+        order_lines = grouped[expected_key][0]['order_line']
+        self.assertEquals(order_lines, [(0, 0, {
+            'name': 'Line',
+            'product_id': 7,
+            'product_qty': 3.5,
+            'product_uom': 10,
+        })])
+
+    def test_auto_merge_chunks(self):
+        """Only groups with a changed order are merged, and never split."""
+        orders = []
+        for order_id, partner_id in ((1, 10), (2, 10), (3, 20), (4, 20),
+                                     (5, 30), (6, 30), (7, 30)):
+            order = Mock(id=order_id, state='draft')
+            order.partner_id = Mock(spec=browse_record, id=partner_id)
+            order.location_id = Mock(spec=browse_record, id=2)
+            order.pricelist_id = Mock(spec=browse_record, id=3)
+            orders.append(order)
+
+        chunks = self.po._auto_merge_chunks(orders, [2, 5, 6], 4)
+
+        self.assertEquals(chunks, [[1, 2], [5, 6, 7]])
+
+    def test_plain_merged_value(self):
+        """Commands in merged lines are shown as plain lists of ids."""
+        self.assertEquals(
+            self.po._plain_merged_value(((6, 0, (3, 4)),)), [3, 4])
+        self.assertEquals(self.po._plain_merged_value(7), 7)
+        self.assertEquals(self.po._plain_merged_value('Line'), 'Line')
+
+    def test_fix_workflow_cancels_in_one_go(self):
+        """Old orders are redirected and cancelled in one go."""
+        cr = Mock()
+        with patch.object(self.po, '_redirect_workflows') as redirect, \
+                patch.object(self.po, '_cancel_workflows') as cancel:
+            self.po._fix_workflow(cr, 1, {10: [1, 2], 20: [3]})
+
+        self.assertEquals(redirect.call_count, 1)
+        self.assertEquals(sorted(redirect.call_args[0][1]),
+                          [(1, 10), (2, 10), (3, 20)])
+        self.assertEquals(cancel.call_count, 1)
+        self.assertEquals(sorted(cancel.call_args[0][2]), [1, 2, 3])
+
+    def test_cancel_workflows(self):
+        """The cancel action runs once for all the orders."""
+        cr = Mock()
+        cr.fetchall.return_value = [(5,), (6,)]
+        data_obj = self.registry('ir.model.data')
+        with patch.object(data_obj, 'get_object_reference',
+                          return_value=('purchase', 99)), \
+                patch.object(self.po, 'wkf_action_cancel') as action:
+            self.po._cancel_workflows(cr, 1, [1, 2])
+
+        self.assertEquals(action.call_count, 1)
+        self.assertEquals(action.call_args[0][2], [1, 2])
+        queries = [call[0][0].split()[0] for call in
+                   cr.execute.call_args_list]
+        self.assertEquals(queries, ['SELECT', 'DELETE', 'INSERT', 'UPDATE'])
+        self.assertEquals(cr.execute.call_args_list[2][0][1], (99, (5, 6)))
+
+    def test_auto_merge_watermark_overlap(self):
+        """The watermark is set back by the overlap."""
+        cr = Mock()
+        cr.fetchone.return_value = [datetime(2015, 3, 2, 10, 0)]
+        param_obj = self.registry('ir.config_parameter')
+        with patch.object(param_obj, 'get_param', return_value=False), \
+                patch.object(param_obj, 'set_param') as set_param, \
+                patch.object(self.po, '_auto_merge_domain', return_value=[]), \
+                patch.object(self.po, 'search', return_value=[]):
+            self.po.run_auto_merge(cr, 1, overlap=5)
+
+        self.assertEquals(cr.execute.call_args_list[0][0][1], (5,))
+        self.assertEquals(set_param.call_args[0][3], '2015-03-02 10:00:00')
+
+    def test_merge_parallel_schedules_jobs(self):
+        """One scheduled job is created per supplier partition."""
+        cr = Mock()
+        cron_obj = self.registry('ir.cron')
+        partitions = {1: [10, 11], 2: [12, 13]}
+        with patch.object(self.po, '_partition_orders_for_merge',
+                          return_value=partitions), \
+                patch.object(cron_obj, 'search', return_value=[90]), \
+                patch.object(cron_obj, 'unlink') as unlink, \
+                patch.object(cron_obj, 'create',
+                             side_effect=[100, 101]) as create:
+            cron_ids = self.po.do_merge_parallel(cr, 7, [10, 11, 12, 13])
+
+        self.assertEquals(cron_ids, [100, 101])
+        self.assertEquals(unlink.call_args[0][1:3], (SUPERUSER_ID, [90]))
+        jobs = sorted(call[0][2]['args'] for call in create.call_args_list)
+        self.assertEquals(jobs, ['([10, 11], 0)', '([12, 13], 0)'])
+        for call in create.call_args_list:
+            self.assertEquals(call[0][1], SUPERUSER_ID)
+            values = call[0][2]
+            self.assertEquals(values['function'], 'run_merge_job')
+            self.assertEquals(values['numbercall'], 1)
+            self.assertEquals(values['user_id'], 7)
+
+    def test_run_merge_job(self):
+        """A job merges the orders of its partition that still exist."""
+        cr = MagicMock()
+        with patch.object(self.po, 'search', return_value=[10, 11]), \
+                patch.object(self.po, 'do_merge',
+                             return_value={20: [10, 11]}) as do_merge:
+            result, elapsed = self.po.run_merge_job(cr, 1, [10, 11, 12])
+
+        self.assertEquals(result, {20: [10, 11]})
+        self.assertEquals(do_merge.call_args[0][2], [10, 11])
+        self.assertTrue(elapsed >= 0)
+
+    def test_run_merge_job_retry(self):
+        """A job failing on a serialization error is scheduled again."""
+        cr = MagicMock()
+
+        class SerializationFailure(OperationalError):
+            pgcode = errorcodes.SERIALIZATION_FAILURE
+
+        with patch.object(self.po, 'search', return_value=[10, 11]), \
+                patch.object(self.po, 'do_merge',
+                             side_effect=SerializationFailure()), \
+                patch.object(self.po, '_schedule_merge_job') as schedule:
+            result, __ = self.po.run_merge_job(cr, 1, [10, 11], tries=1)
+
+        self.assertEquals(result, {})
+        self.assertEquals(schedule.call_args[0][2], [10, 11])
+        self.assertEquals(schedule.call_args[1]['tries'], 2)
+        self.assertEquals(schedule.call_args[1]['delay'], 4)
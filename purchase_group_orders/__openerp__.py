@@ -19,17 +19,21 @@
 #
 ##############################################################################
 {'name': 'Purchase Group Orders by Shop and Carrier',
- 'version': '0.4',
+ 'version': '0.5',
  'author': "Camptocamp,Odoo Community Association (OCA)",
  'maintainer': 'Camptocamp',
  'category': 'Purchase Management',
  'complexity': "normal",  # easy, normal, expert
  'depends': ['delivery', 'sale', 'purchase',
+             'purchase_group_hooks',
              ],
  'description': """Only merge PO with the same shop and carrier.
 
  This eases the warehouse managements as the incoming pickings are grouped
  in a more convenient way.
+
+ The merge itself is done by purchase_group_hooks, this module only adds the
+ shop and the carrier to the merge key.
  """,
  'website': 'http://www.camptocamp.com/',
  'init_xml': [],
@@ -33,6 +33,13 @@ Purchase Requisition Auto RFQ
 This module adds a button on the purchase requisition form to create a RFQ
 using the suppliers from the products listed in the requisition.
 
+Each supplier gets a RFQ with the products it sells. With many suppliers, the
+RFQs can be created concurrently by scheduled jobs: set the system parameter
+'purchase_requisition_auto_rfq.use_jobs' to True. Each RFQ is then created by
+the scheduler in its own transaction, as many at a time as there are cron
+workers. The progress of the jobs is shown on the requisition, and the failed
+ones can be retried.
+
 Note: nose is required to run the tests. It is not listed as en external
 dependency because it is not needed in production.
 
@@ -41,11 +48,13 @@ dependency because it is not needed in production.
              ],
     "demo": ['demo/product_and_supplier.yml',
              ],
-    "data": ["view/purchase_requisition.xml",
+    "data": ["security/ir.model.access.csv",
+             "view/purchase_requisition.xml",
              ],
     "auto_install": False,
     "test": ["test/purchase_requisition.yml",
              "test/purchase_requisition_no_supplier.yml",
+             "test/purchase_requisition_jobs.yml",
              ],
     'installable': False,
     "certificate": "",
@@ -19,3 +19,4 @@
 ##############################################################################
 
 from . import purchase_requisition
+from . import rfq_job
@@ -17,15 +17,129 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 ##############################################################################
-from collections import defaultdict
+from collections import OrderedDict
 
-from openerp import models, api
+from openerp import models, fields, api
+from openerp.exceptions import except_orm
+from openerp.tools.safe_eval import safe_eval
 from openerp.tools.translate import _
 
+JOBS_PARAM = 'purchase_requisition_auto_rfq.use_jobs'
+
 
 class PurchaseRequisition(models.Model):
     _inherit = 'purchase.requisition'
 
+    rfq_job_ids = fields.One2many('purchase.requisition.rfq.job',
+                                  'requisition_id', 'RFQ Generation Jobs')
+    rfq_job_progress = fields.Char('RFQ Generation',
+                                   compute='_compute_rfq_job_progress')
+
+    @api.multi
+    @api.depends('rfq_job_ids.state')
+    def _compute_rfq_job_progress(self):
+        for requisition in self:
+            states = requisition.rfq_job_ids.mapped('state')
+            if not states:
+                requisition.rfq_job_progress = False
+                continue
+            requisition.rfq_job_progress = _(
+                '%d of %d RFQs generated, %d pending, %d failed') % (
+                states.count('done'), len(states), states.count('pending'),
+                states.count('failed'))
+
+    @api.multi
+    def _lines_by_seller(self):
+        """Find the registered suppliers of the products of the requisitions
+        with one query over product_supplierinfo.
+
+        Return a dictionary {requisition_id: (sellers, lines_without_seller)}
+        where sellers is an ordered dictionary {seller_id: [line_id]}. The
+        lines without product have no seller.
+        """
+        self.env['product.supplierinfo'].check_access_rights('read')
+        res = dict((requisition.id, (OrderedDict(), []))
+                   for requisition in self)
+        if not self.ids:
+            return res
+        self.env.cr.execute("""
+            SELECT prl.requisition_id, prl.id, psi.name
+            FROM purchase_requisition_line prl
+            LEFT JOIN product_product pp ON pp.id = prl.product_id
+            LEFT JOIN product_supplierinfo psi
+                ON psi.product_tmpl_id = pp.product_tmpl_id
+            WHERE prl.requisition_id IN %s
+            ORDER BY prl.requisition_id, prl.id, psi.sequence, psi.id
+        """, (tuple(self.ids),))
+        for requisition_id, line_id, seller_id in self.env.cr.fetchall():
+            sellers, without_seller = res[requisition_id]
+            if seller_id:
+                line_ids = sellers.setdefault(seller_id, [])
+                # the rows of a line are consecutive, a seller listed twice
+                # for a product gives the line once
+                if not line_ids or line_ids[-1] != line_id:
+                    line_ids.append(line_id)
+            else:
+                without_seller.append(line_id)
+        return res
+
+    @api.multi
+    def _supplier_rfq_context(self):
+        """Return the context in which the RFQs of the requisition are
+        created. Hook for the modules that create another kind of RFQ."""
+        self.ensure_one()
+        return {'mail_create_nolog': True}
+
+    @api.multi
+    def _make_supplier_rfq(self, supplier, lines):
+        """Create the RFQ of the requisition for a supplier with only the
+        given lines, the way make_purchase_order does with all of them"""
+        self.ensure_one()
+        if not self.multiple_rfq_per_supplier:
+            for rfq in self.purchase_ids:
+                if rfq.state != 'cancel' and rfq.partner_id == supplier:
+                    raise except_orm(
+                        _('Warning!'),
+                        _('You have already one %s purchase order for this '
+                          'partner, you must cancel this purchase order to '
+                          'create a new quotation.') % rfq.state)
+        requisition = self.with_context(**self._supplier_rfq_context())
+        purchase = requisition.env['purchase.order'].create(
+            requisition._prepare_purchase_order(requisition, supplier))
+        purchase.message_post(body=_("RFQ created"))
+        purchase_line_obj = requisition.env['purchase.order.line']
+        for line in lines:
+            purchase_line_obj.create(requisition._prepare_purchase_order_line(
+                requisition, line, purchase.id, supplier))
+        return purchase
+
+    @api.model
+    def _auto_rfq_use_jobs(self):
+        """Whether the RFQs are created by scheduled jobs, from the system
+        parameter purchase_requisition_auto_rfq.use_jobs"""
+        return bool(safe_eval(self.env['ir.config_parameter'].get_param(
+            JOBS_PARAM, 'False')))
+
+    @api.model
+    def _schedule_rfq_jobs(self, tasks):
+        """Create and schedule a job for each task (requisition_id,
+        seller_id, line_ids)"""
+        Job = self.env['purchase.requisition.rfq.job']
+        jobs = Job.browse()
+        for requisition_id, seller_id, line_ids in tasks:
+            jobs |= Job.create({
+                'requisition_id': requisition_id,
+                'partner_id': seller_id,
+                'line_ids': [(6, 0, line_ids)],
+            })
+        jobs._schedule()
+        return jobs
+
+    @api.multi
+    def retry_rfq_jobs(self):
+        self.mapped('rfq_job_ids').retry()
+        return True
+
     @api.multi
     def auto_rfq_from_suppliers(self):
         """create purchase orders from registered suppliers for products in the
@@ -33,37 +147,37 @@ class PurchaseRequisition(models.Model):
 
         The created PO for each supplier will only concern the products for
         which an existing product.supplierinfo record exist for that product.
+
+        When the system parameter purchase_requisition_auto_rfq.use_jobs is
+        set, the RFQs are created concurrently by scheduled jobs, whose
+        progress is shown on the requisition.
         """
-        po_obj = self.env['purchase.order']
-        po_line_obj = self.env['purchase.order.line']
-        seller_products = defaultdict(set)
+        partner_obj = self.env['res.partner']
+        line_obj = self.env['purchase.requisition.line']
+        lines_by_seller = self._lines_by_seller()
+        tasks = [(requisition_id, seller_id, line_ids)
+                 for requisition_id, (sellers, __)
+                 in sorted(lines_by_seller.iteritems())
+                 for seller_id, line_ids in sellers.iteritems()]
+        if self._auto_rfq_use_jobs() and len(tasks) > 1:
+            self._schedule_rfq_jobs(tasks)
+        else:
+            for requisition_id, seller_id, line_ids in tasks:
+                self.browse(requisition_id)._make_supplier_rfq(
+                    partner_obj.browse(seller_id), line_obj.browse(line_ids))
         for requisition in self:
-            products_without_supplier = []
-            for line in requisition.line_ids:
-                sellers = line.product_id.product_tmpl_id.seller_ids
-                if not sellers:
-                    products_without_supplier.append(line.product_id)
-                for seller in sellers:
-                    seller_products[seller.name.id].add(line.product_id.id)
-            if products_without_supplier:
+            __, without_seller = lines_by_seller[requisition.id]
+            if without_seller:
                 body = _(u'<p><b>RFQ generation</b></p>'
                          '<p>The following products have no '
                          'registered suppliers and are not included in the '
                          'generated RFQs:<ul>%s</ul></p>')
-                body %= ''.join(u'<li>%s</li>' % product.name
-                                for product in products_without_supplier)
-                self.message_post(body=body,
-                                  subject=_(u'RFQ Generation'))
-        lines_to_remove = po_line_obj.browse()
-        for seller_id, sold_products in seller_products.iteritems():
-            po_info = self.make_purchase_order(seller_id)
-            # make_purchase_order creates po lines for all the products in the
-            # requisition. We need to unlink all the created lines for which
-            # the supplier is not an official supplier for the product.
-            po_ids = po_info.values()
-            for purchase in po_obj.browse(po_ids):
-                for line in purchase.order_line:
-                    if line.product_id.id not in sold_products:
-                        lines_to_remove |= line
-        lines_to_remove.unlink()
+                body %= ''.join(
+                    u'<li>%s</li>' % (
+                        line.product_id.name or
+                        _(u'Line without product (quantity %s)') %
+                        line.product_qty)
+                    for line in line_obj.browse(without_seller))
+                requisition.message_post(body=body,
+                                         subject=_(u'RFQ Generation'))
         return True
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+import logging
+from datetime import datetime, timedelta
+
+from psycopg2 import OperationalError, errorcodes
+
+from openerp import models, fields, api
+from openerp.tools.translate import _
+
+_logger = logging.getLogger(__name__)
+
+MAX_TRIES = 5
+RETRY_PGCODES = (errorcodes.SERIALIZATION_FAILURE,
+                 errorcodes.DEADLOCK_DETECTED)
+
+
+class PurchaseRequisitionRFQJob(models.Model):
+    """RFQ of one supplier of a requisition, created by a scheduled action.
+
+    Each job gets a one-shot scheduled action, so the RFQs of many
+    suppliers are created concurrently by the scheduler workers, each one in
+    its own transaction. The jobs are created in the transaction of the
+    requisition: they only start once it is committed and never run if it
+    is rolled back.
+    """
+    _name = 'purchase.requisition.rfq.job'
+    _description = 'RFQ Generation Job'
+    _order = 'id'
+
+    requisition_id = fields.Many2one('purchase.requisition', 'Requisition',
+                                     required=True, ondelete='cascade',
+                                     select=True)
+    partner_id = fields.Many2one('res.partner', 'Supplier', required=True)
+    line_ids = fields.Many2many('purchase.requisition.line',
+                                'purchase_requisition_rfq_job_line_rel',
+                                'job_id', 'line_id', 'Lines')
+    state = fields.Selection([('pending', 'Pending'),
+                              ('done', 'Done'),
+                              ('failed', 'Failed')],
+                             default='pending', required=True,
+                             readonly=True)
+    tries = fields.Integer(readonly=True)
+    purchase_id = fields.Many2one('purchase.order', 'RFQ', readonly=True)
+    error = fields.Text(readonly=True)
+    cron_id = fields.Many2one('ir.cron', 'Scheduled Action',
+                              ondelete='set null', readonly=True)
+
+    @api.multi
+    def _schedule(self, delay=0):
+        """Create the one-shot scheduled action of each job.
+
+        The scheduled actions can only be created by the administrators, so
+        they are created as superuser, and run as the current user. The
+        scheduled actions of the jobs that have run are deleted.
+        """
+        self._unlink_spent_crons()
+        nextcall = fields.Datetime.to_string(
+            datetime.utcnow() + timedelta(minutes=delay))
+        Cron = self.env['ir.cron'].sudo()
+        for job in self:
+            job.cron_id = Cron.create({
+                'name': 'RFQ of %s for %s' % (job.partner_id.name,
+                                              job.requisition_id.name),
+                'user_id': self.env.uid,
+                'model': self._name,
+                'function': 'run_job',
+                'args': repr((job.id,)),
+                'interval_number': 1,
+                'interval_type': 'minutes',
+                'numbercall': 1,
+                'doall': True,
+                'nextcall': nextcall,
+            })
+
+    @api.model
+    def _unlink_spent_crons(self):
+        """Delete the scheduled actions of the jobs that have run. A one-shot
+        scheduled action is only deactivated once run, and it cannot delete
+        itself while the scheduler holds a lock on it."""
+        self.env['ir.cron'].sudo().with_context(active_test=False).search([
+            ('model', '=', self._name),
+            ('function', '=', 'run_job'),
+            ('active', '=', False),
+            ('numbercall', '=', 0),
+        ]).unlink()
+
+    @api.model
+    def run_job(self, job_id):
+        """Create the RFQ of a job. Called by the scheduler.
+
+        A job that fails on a serialization error or a deadlock is
+        scheduled again a few times, later and later. Any other error fails
+        the job, which is reported on its requisition.
+        """
+        job = self.browse(job_id).exists()
+        if not job or job.state != 'pending':
+            return
+        tries = job.tries + 1
+        try:
+            with self.env.cr.savepoint():
+                purchase = job.requisition_id._make_supplier_rfq(
+                    job.partner_id, job.line_ids)
+        except OperationalError as e:
+            self.env.invalidate_all()
+            if e.pgcode in RETRY_PGCODES and tries < MAX_TRIES:
+                _logger.info('RFQ job %d failed with %s, retrying in %d '
+                             'minutes', job.id, errorcodes.lookup(e.pgcode),
+                             2 ** tries)
+                job.tries = tries
+                job._schedule(delay=2 ** tries)
+                return
+            job._fail(tries, '%s' % e)
+            return
+        except Exception as e:
+            self.env.invalidate_all()
+            _logger.exception('RFQ job %d failed', job.id)
+            job._fail(tries, '%s' % (getattr(e, 'value', None) or e))
+            return
+        job.write({'state': 'done', 'tries': tries,
+                   'purchase_id': purchase.id})
+
+    @api.multi
+    def _fail(self, tries, error):
+        self.write({'state': 'failed', 'tries': tries, 'error': error})
+        for job in self:
+            body = _(u'<p><b>RFQ generation</b></p>'
+                     '<p>The RFQ of %s could not be generated: %s</p>')
+            job.requisition_id.message_post(
+                body=body % (job.partner_id.name, error),
+                subject=_(u'RFQ Generation'))
+
+    @api.multi
+    def retry(self):
+        """Schedule the failed jobs again"""
+        failed = self.filtered(lambda job: job.state == 'failed')
+        failed.write({'state': 'pending', 'tries': 0, 'error': False})
+        failed._schedule()
+        return True
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+"""Compare the generation of the RFQs of a requisition from the suppliers of
+its products: all the lines created then the unrelated ones unlinked, as it
+used to be done, against only the relevant lines.
+
+This is not part of the test suite. Run it on a database where the module is
+installed:
+
+    python benchmark_auto_rfq.py -c /path/to/openerp.cfg -d <database>
+
+The requisition has 1000 lines and its products are sold by 50 sellers, 3
+sellers per product. All the records created by the benchmark are rolled
+back at the end.
+
+"""
+import sys
+import time
+from collections import defaultdict
+
+import openerp
+from openerp import SUPERUSER_ID, api
+from openerp.modules.registry import RegistryManager
+
+LINES = 1000
+SELLERS = 50
+SELLERS_PER_PRODUCT = 3
+
+
+def create_requisition(env):
+    partners = [env['res.partner'].create({'name': 'Seller %d' % index,
+                                           'supplier': True})
+                for index in xrange(SELLERS)]
+    lines = []
+    for index in xrange(LINES):
+        product = env['product.product'].create({
+            'name': 'Benchmark product %d' % index,
+            'type': 'product',
+            'seller_ids': [(0, 0, {'name': partners[(index + shift) %
+                                                    SELLERS].id})
+                           for shift in xrange(SELLERS_PER_PRODUCT)],
+        })
+        lines.append((0, 0, {'product_id': product.id, 'product_qty': 1.0}))
+    return env['purchase.requisition'].create({'line_ids': lines})
+
+
+def generate_and_unlink(requisition):
+    """The former implementation"""
+    seller_products = defaultdict(set)
+    for line in requisition.line_ids:
+        for seller in line.product_id.product_tmpl_id.seller_ids:
+            seller_products[seller.name.id].add(line.product_id.id)
+    lines_to_remove = requisition.env['purchase.order.line'].browse()
+    for seller_id, sold_products in seller_products.iteritems():
+        po_info = requisition.make_purchase_order(seller_id)
+        for purchase in requisition.env['purchase.order'].browse(
+                po_info.values()):
+            for line in purchase.order_line:
+                if line.product_id.id not in sold_products:
+                    lines_to_remove |= line
+    lines_to_remove.unlink()
+
+
+def generate_relevant_lines(requisition):
+    requisition.auto_rfq_from_suppliers()
+
+
+def measure(env, generate):
+    requisition = create_requisition(env)
+    env.invalidate_all()
+    start = time.time()
+    generate(requisition)
+    elapsed = time.time() - start
+    requisition.invalidate_cache()
+    assert len(requisition.purchase_ids) == SELLERS
+    assert sum(len(rfq.order_line) for rfq in requisition.purchase_ids) == \
+        LINES * SELLERS_PER_PRODUCT
+    return elapsed
+
+
+def main(args):
+    openerp.tools.config.parse_config(args)
+    dbname = openerp.tools.config['db_name']
+    registry = RegistryManager.get(dbname)
+    with api.Environment.manage():
+        cr = registry.cursor()
+        try:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            unlink = measure(env, generate_and_unlink)
+            relevant = measure(env, generate_relevant_lines)
+            print('%d lines, %d sellers' % (LINES, SELLERS))
+            print('%-30s %8.2fs' % ('all lines then unlink', unlink))
+            print('%-30s %8.2fs' % ('relevant lines only', relevant))
+        finally:
+            cr.rollback()
+            cr.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -43,3 +43,14 @@ class PurchaseRequisition(models.Model):
             po_info = requisitions.make_purchase_order(seller_id)
             res.update(po_info)
         return res
+
+    @api.multi
+    def _supplier_rfq_context(self):
+        """
+        Depending on bid_tendering_mode, generate a bid or a rfq
+        """
+        res = super(PurchaseRequisition, self)._supplier_rfq_context()
+        if 'draft_bid' not in self.env.context:
+            res['draft_bid'] = 0 if self.bid_tendering_mode == 'restricted' \
+                else 1
+        return res
@@ -27,13 +27,17 @@
              "purchase_requisition_multicurrency",
              ],
  "demo": [],
- "data": ["wizard/modal.xml",
+ "data": ["security/ir.model.access.csv",
+          "wizard/modal.xml",
           "wizard/purchase_requisition_partner_view.xml",
           "wizard/update_bid_internal_remark.xml",
           "wizard/update_remark.xml",
+          "wizard/bid_optimizer.xml",
+          "wizard/bid_import.xml",
           "view/purchase_requisition.xml",
           "view/purchase_order.xml",
           "view/report_purchaserequisition.xml",
+          "view/bid_comparison.xml",
           "report.xml",
           "workflow/purchase_order.xml",
           "workflow/purchase_requisition.xml",
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+#
+#
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+from werkzeug.wrappers import Response
+
+from openerp import api, http
+from openerp.http import request
+from openerp.modules.registry import RegistryManager
+
+
+def _stream_bid_comparison(dbname, uid, context, requisition_id):
+    """Generate the CSV with its own cursor, as the one of the request is
+    closed before the response is streamed"""
+    with api.Environment.manage():
+        with RegistryManager.get(dbname).cursor() as cr:
+            env = api.Environment(cr, uid, context)
+            requisition = env['purchase.requisition'].browse(requisition_id)
+            for chunk in requisition.iter_bid_comparison_csv():
+                yield chunk
+
+
+class BidComparison(http.Controller):
+
+    @http.route('/purchase_requisition_bid_selection/bid_comparison/'
+                '<int:requisition_id>.csv',
+                type='http', auth='user')
+    def bid_comparison_csv(self, requisition_id, **kwargs):
+        requisition = request.env['purchase.requisition'].browse(
+            requisition_id)
+        requisition.check_access_rule('read')
+        filename = '%s-bids.csv' % requisition.name.replace('/', '_')
+        return Response(
+            _stream_bid_comparison(request.cr.dbname, request.uid,
+                                   dict(request.context), requisition_id),
+            headers=[('Content-Type', 'text/csv; charset=utf-8'),
+                     ('Content-Disposition',
+                      'attachment; filename="%s"' % filename)],
+            direct_passthrough=True)
@@ -3,3 +3,6 @@ from . import purchase_requisition
 from . import purchase_order
 from . import modal_selection_reasons
 from . import modal_validity
+from . import bid_comparison
+from . import bid_optimizer
+from . import bid_import
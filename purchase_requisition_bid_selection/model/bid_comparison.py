@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+#
+#
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+import csv
+from cStringIO import StringIO
+
+from openerp import models, fields, api, tools
+import openerp.addons.decimal_precision as dp
+
+CSV_COLUMNS = [
+    ('requisition_line', 'Call for Bid Line'),
+    ('product', 'Product'),
+    ('requested_qty', 'Requested Quantity'),
+    ('bidder', 'Bidder'),
+    ('bid', 'Bid'),
+    ('price_unit', 'Unit Price'),
+    ('currency', 'Currency'),
+    ('quantity_bid', 'Quantity Bid'),
+    ('lead_time', 'Lead Time (days)'),
+    ('price_unit_co', 'Normalised Unit Price'),
+    ('bid_rank', 'Rank'),
+    ('is_best_bid', 'Best Bid'),
+]
+
+# states of the bids that are not received yet
+UNRECEIVED_BID_STATES = ('draft', 'sent', 'draftbid')
+
+
+class PurchaseRequisitionBidComparison(models.Model):
+    """One cell of the comparison of the bids of a call for bids: the bid
+    line of a bidder for a call for bids line.
+
+    Bids are ranked on their unit price in the currency of the call for bids
+    within each call for bids line. Only the quoted lines of the received
+    bids are ranked: the lines of a bid are created without price, and the
+    others come last, without rank.
+    """
+    _name = 'purchase.requisition.bid.comparison'
+    _description = 'Bid Comparison'
+    _auto = False
+    _order = 'requisition_line_id, bid_rank, partner_id'
+
+    requisition_id = fields.Many2one('purchase.requisition',
+                                     'Call for Bids',
+                                     readonly=True)
+    requisition_line_id = fields.Many2one('purchase.requisition.line',
+                                          'Call for Bid Line',
+                                          readonly=True)
+    order_id = fields.Many2one('purchase.order', 'Bid', readonly=True)
+    order_line_id = fields.Many2one('purchase.order.line', 'Bid Line',
+                                    readonly=True)
+    partner_id = fields.Many2one('res.partner', 'Bidder', readonly=True)
+    product_id = fields.Many2one('product.product', 'Product',
+                                 readonly=True)
+    currency_id = fields.Many2one('res.currency', 'Currency', readonly=True)
+    requested_qty = fields.Float(
+        'Requested Quantity',
+        digits=dp.get_precision('Product Unit of Measure'),
+        readonly=True)
+    quantity_bid = fields.Float(
+        'Quantity Bid',
+        digits=dp.get_precision('Product Unit of Measure'),
+        readonly=True)
+    price_unit = fields.Float('Unit Price',
+                              digits=dp.get_precision('Product Price'),
+                              readonly=True)
+    price_unit_co = fields.Float(
+        'Normalised Unit Price',
+        digits=dp.get_precision('Account'),
+        readonly=True,
+        help="Unit Price in the currency of the call for bids.")
+    lead_time = fields.Integer(
+        'Lead Time (days)',
+        readonly=True,
+        help="Days between the bid date and its scheduled date.")
+    bid_eligible = fields.Boolean('Eligible', readonly=True)
+    meets_specifications = fields.Boolean(readonly=True)
+    quoted = fields.Boolean(
+        'Quoted',
+        readonly=True,
+        help="The bid is received and the line has a price.")
+    bid_rank = fields.Integer('Rank', readonly=True)
+    is_best_bid = fields.Boolean('Best Bid', readonly=True)
+
+    def init(self, cr):
+        tools.drop_view_if_exists(cr, self._table)
+        cr.execute("""
+            CREATE OR REPLACE VIEW %(table)s AS (
+                SELECT
+                    c.*,
+                    CASE WHEN c.quoted THEN rank() OVER w END AS bid_rank,
+                    c.quoted AND rank() OVER w = 1 AS is_best_bid
+                FROM (
+                    SELECT
+                        pol.id AS id,
+                        po.requisition_id AS requisition_id,
+                        pol.requisition_line_id AS requisition_line_id,
+                        po.id AS order_id,
+                        pol.id AS order_line_id,
+                        po.partner_id AS partner_id,
+                        prl.product_id AS product_id,
+                        pl.currency_id AS currency_id,
+                        prl.product_qty AS requested_qty,
+                        pol.quantity_bid AS quantity_bid,
+                        pol.price_unit AS price_unit,
+                        pol.price_unit_co AS price_unit_co,
+                        pol.date_planned::date - po.date_order::date
+                            AS lead_time,
+                        po.bid_eligible AS bid_eligible,
+                        po.meets_specifications AS meets_specifications,
+                        (pol.price_unit > 0 AND
+                         po.state NOT IN %(unreceived)s) AS quoted
+                    FROM purchase_order_line pol
+                    JOIN purchase_order po ON po.id = pol.order_id
+                    JOIN purchase_requisition_line prl
+                        ON prl.id = pol.requisition_line_id
+                    LEFT JOIN product_pricelist pl
+                        ON pl.id = po.pricelist_id
+                    WHERE po.type = 'bid'
+                      AND po.state != 'cancel'
+                ) c
+                WINDOW w AS (PARTITION BY c.requisition_line_id, c.quoted
+                             ORDER BY c.price_unit_co)
+            )""" % {'table': self._table,
+                    'unreceived': UNRECEIVED_BID_STATES})
+
+
+class PurchaseRequisition(models.Model):
+    _inherit = 'purchase.requisition'
+
+    @api.multi
+    def _bid_comparison_cells(self, line_ids):
+        """Read the comparison cells of the given call for bids lines in one
+        query and return them as dictionaries.
+
+        The view is read with SQL, so the bids are first searched to apply
+        the record rules of the purchase orders.
+        """
+        self.check_access_rule('read')
+        self.env['purchase.order.line'].check_access_rights('read')
+        if not line_ids:
+            return []
+        bids = self.env['purchase.order'].search(
+            [('requisition_id', 'in', self.ids), ('type', '=', 'bid')])
+        if not bids:
+            return []
+        self.env.cr.execute("""
+            SELECT c.requisition_line_id, c.partner_id, rp.name,
+                   c.order_id, po.name, c.order_line_id,
+                   c.price_unit, c.currency_id, cur.name,
+                   c.quantity_bid, c.lead_time, c.price_unit_co,
+                   c.bid_eligible, c.meets_specifications,
+                   c.bid_rank, c.is_best_bid
+            FROM purchase_requisition_bid_comparison c
+            JOIN res_partner rp ON rp.id = c.partner_id
+            JOIN purchase_order po ON po.id = c.order_id
+            LEFT JOIN res_currency cur ON cur.id = c.currency_id
+            WHERE c.requisition_line_id IN %s
+              AND c.order_id IN %s
+            ORDER BY c.requisition_line_id, c.bid_rank, rp.name
+        """, (tuple(line_ids), tuple(bids.ids)))
+        keys = ('requisition_line_id', 'partner_id', 'partner_name',
+                'order_id', 'order_name', 'order_line_id',
+                'price_unit', 'currency_id', 'currency_name',
+                'quantity_bid', 'lead_time', 'price_unit_co',
+                'bid_eligible', 'meets_specifications',
+                'bid_rank', 'is_best_bid')
+        return [dict(zip(keys, row)) for row in self.env.cr.fetchall()]
+
+    @api.multi
+    def get_bid_matrix(self, offset=0, limit=None):
+        """Return the comparison of the bids as a matrix of call for bids
+        lines and bidders.
+
+        The call for bids lines are paged with offset and limit. The result
+        is a dictionary with:
+
+        * total: the number of call for bids lines
+        * bidders: the bidders of the page, as dictionaries with id and name
+        * lines: the call for bids lines of the page, each with its id, name,
+          product_name, product_qty and cells, the list of the bids of the
+          bidders (price, quantity, lead time, normalised price, rank, best
+          bid)
+
+        """
+        self.ensure_one()
+        Line = self.env['purchase.requisition.line']
+        domain = [('requisition_id', '=', self.id)]
+        lines = Line.search(domain, offset=offset, limit=limit,
+                            order='id')
+        cells = self._bid_comparison_cells(lines.ids)
+
+        cells_by_line = {}
+        bidders = {}
+        for cell in cells:
+            cells_by_line.setdefault(cell['requisition_line_id'],
+                                     []).append(cell)
+            bidders[cell['partner_id']] = cell['partner_name']
+
+        return {
+            'total': Line.search_count(domain),
+            'bidders': [{'id': partner_id, 'name': name}
+                        for partner_id, name in sorted(bidders.items(),
+                                                       key=lambda b: b[1])],
+            'lines': [{'id': line_id,
+                       'name': name,
+                       'product_name': line.product_id.name,
+                       'product_qty': line.product_qty,
+                       'cells': cells_by_line.get(line_id, [])}
+                      for line, (line_id, name) in zip(lines,
+                                                       lines.name_get())],
+        }
+
+    @api.multi
+    def top_bids(self, k=3, only_eligible=False):
+        """Return the k cheapest bid lines of each call for bids line, ranked
+        on their unit price in the currency of the call for bids, with one
+        query. Bid lines with the same price share their rank, so a line
+        can get more than k bid lines. Like in the comparison, only the
+        lines with a price of the received bids are ranked.
+
+        :param only_eligible: only rank the eligible bids that meet the
+                              specifications
+        :returns: dictionary {requisition_line_id: [(bid_line_id, partner_id,
+                  price_unit_co, rank)]} sorted by rank
+
+        """
+        self.check_access_rule('read')
+        self.env['purchase.order.line'].check_access_rights('read')
+        if not self.ids:
+            return {}
+        eligible = ("AND po.bid_eligible AND po.meets_specifications"
+                    if only_eligible else "")
+        self.env.cr.execute("""
+            SELECT requisition_line_id, id, partner_id, price_unit_co,
+                   bid_rank
+            FROM (
+                SELECT pol.requisition_line_id, pol.id, po.partner_id,
+                       pol.price_unit_co,
+                       rank() OVER (PARTITION BY pol.requisition_line_id
+                                    ORDER BY pol.price_unit_co) AS bid_rank
+                FROM purchase_order_line pol
+                JOIN purchase_order po ON po.id = pol.order_id
+                JOIN purchase_requisition_line prl
+                    ON prl.id = pol.requisition_line_id
+                WHERE prl.requisition_id IN %%s
+                  AND po.type = 'bid'
+                  AND po.state != 'cancel'
+                  AND po.state NOT IN %%s
+                  AND pol.price_unit > 0
+                  AND pol.price_unit_co IS NOT NULL
+                  %s
+            ) ranked
+            WHERE bid_rank <= %%s
+            ORDER BY requisition_line_id, bid_rank, id
+        """ % eligible, (tuple(self.ids), UNRECEIVED_BID_STATES, k))
+        res = {}
+        for row in self.env.cr.fetchall():
+            res.setdefault(row[0], []).append(row[1:])
+        return res
+
+    @api.multi
+    def open_bid_comparison(self):
+        """Open the comparison of the bids of the call for bids"""
+        ActWindow = self.env['ir.actions.act_window']
+        res = ActWindow.for_xml_id('purchase_requisition_bid_selection',
+                                   'action_bid_comparison')
+        res['domain'] = [('requisition_id', 'in', self.ids)]
+        res['context'] = {'search_default_groupby_requisitionline': True}
+        return res
+
+    @api.multi
+    def export_bid_comparison(self):
+        """Download the comparison of the bids as CSV"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/purchase_requisition_bid_selection/bid_comparison/'
+                   '%d.csv' % self.id,
+            'target': 'self',
+        }
+
+    @api.multi
+    def iter_bid_comparison_csv(self, page_size=500):
+        """Yield the comparison of the bids as CSV, one page of call for
+        bids lines at a time, with one row per bid line."""
+        self.ensure_one()
+        buf = StringIO()
+        writer = csv.writer(buf)
+        writer.writerow([label for __, label in CSV_COLUMNS])
+        offset = 0
+        while True:
+            matrix = self.get_bid_matrix(offset=offset, limit=page_size)
+            for line in matrix['lines']:
+                for cell in line['cells']:
+                    row = {
+                        'requisition_line': line['name'],
+                        'product': line['product_name'],
+                        'requested_qty': line['product_qty'],
+                        'bidder': cell['partner_name'],
+                        'bid': cell['order_name'],
+                        'price_unit': cell['price_unit'],
+                        'currency': cell['currency_name'],
+                        'quantity_bid': cell['quantity_bid'],
+                        'lead_time': cell['lead_time'],
+                        'price_unit_co': cell['price_unit_co'],
+                        'bid_rank': cell['bid_rank'],
+                        'is_best_bid': int(cell['is_best_bid']),
+                    }
+                    writer.writerow([
+                        tools.ustr(row[key]).encode('utf-8')
+                        if row[key] is not None else ''
+                        for key, __ in CSV_COLUMNS
+                    ])
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            offset += page_size
+            if offset >= matrix['total']:
+                break
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+#
+#
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+import csv
+import logging
+
+from openerp import models, fields, api
+from openerp.exceptions import except_orm
+from openerp.tools.translate import _
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import openpyxl
+except ImportError:
+    _logger.debug('Cannot import openpyxl, XLSX bids cannot be imported')
+    openpyxl = None
+
+# states of the quotations that can still receive a bid
+OPEN_BID_STATES = ('draftbid', 'sent')
+# value of a supplier name matching several suppliers
+AMBIGUOUS_SUPPLIER = 'ambiguous'
+
+
+def _cell(value):
+    if isinstance(value, str):
+        value = value.decode('utf-8')
+    if isinstance(value, basestring):
+        value = value.strip()
+    return value if value not in (None, '') else None
+
+
+def iter_csv_rows(fileobj):
+    """Yield the rows of a CSV file as dictionaries keyed by the lowercase
+    column titles of its first row"""
+    reader = csv.reader(fileobj)
+    header = [(_cell(title) or '').lower() for title in next(reader, [])]
+    for row in reader:
+        yield dict(zip(header, [_cell(value) for value in row]))
+
+
+def iter_xlsx_rows(fileobj):
+    """Yield the rows of the first sheet of a XLSX file as dictionaries keyed
+    by the lowercase column titles of its first row. The workbook is read
+    in read-only mode, which does not load the whole sheet in memory."""
+    if openpyxl is None:
+        raise except_orm(_('Error!'),
+                         _('The python library openpyxl is required to '
+                           'import XLSX files.'))
+    workbook = openpyxl.load_workbook(fileobj, read_only=True,
+                                      data_only=True)
+    rows = workbook.active.iter_rows()
+    header = [('%s' % (_cell(cell.value) or '')).lower()
+              for cell in next(rows, [])]
+    for row in rows:
+        yield dict(zip(header, [_cell(cell.value) for cell in row]))
+
+
+def iter_bid_rows(fileobj, filename):
+    if (filename or '').lower().endswith('.xlsx'):
+        return iter_xlsx_rows(fileobj)
+    return iter_csv_rows(fileobj)
+
+
+class PurchaseRequisition(models.Model):
+    _inherit = 'purchase.requisition'
+
+    @api.multi
+    def _bid_import_lookups(self):
+        """Read once what the rows of a bid import are matched against: the
+        call for bids lines by id and by product code and the quotations
+        of the call for bids by supplier"""
+        self.ensure_one()
+        lines_by_id = {}
+        lines_by_code = {}
+        for line in self.line_ids:
+            lines_by_id[line.id] = line.id
+            if line.product_id.default_code:
+                lines_by_code[line.product_id.default_code] = line.id
+        orders = {}
+        unsent_partners = set()
+        closed_partners = set()
+        for order in self.purchase_ids:
+            if order.state in OPEN_BID_STATES:
+                orders[order.partner_id.id] = order.id
+            elif order.state == 'draft':
+                unsent_partners.add(order.partner_id.id)
+            elif order.state != 'cancel':
+                closed_partners.add(order.partner_id.id)
+        return {
+            'lines_by_id': lines_by_id,
+            'lines_by_code': lines_by_code,
+            'orders': orders,
+            'unsent_partners': unsent_partners - set(orders),
+            'closed_partners': closed_partners - set(orders),
+            'partners': {},
+        }
+
+    @api.multi
+    def _resolve_bid_suppliers(self, names, lookups):
+        """Find the suppliers of a batch of rows by reference or name, with
+        one search for the names not seen in the previous batches.
+
+        A reference wins over a name. When several suppliers match, the one
+        with a quotation on the call for bids is taken, if there is only one,
+        otherwise the name is ambiguous.
+        """
+        partners = lookups['partners']
+        missing = list(set(names) - set(partners))
+        if not missing:
+            return
+        found = self.env['res.partner'].search(
+            [('supplier', '=', True),
+             '|', ('ref', 'in', missing), ('name', 'in', missing)])
+        by_ref = {}
+        by_name = {}
+        for partner in found:
+            by_ref.setdefault(partner.ref, set()).add(partner.id)
+            by_name.setdefault(partner.name, set()).add(partner.id)
+        quoted = (set(lookups['orders']) | lookups['unsent_partners'] |
+                  lookups['closed_partners'])
+        for name in missing:
+            candidates = by_ref.get(name) or by_name.get(name) or set()
+            if len(candidates) > 1:
+                candidates = (candidates & quoted) or candidates
+            if len(candidates) > 1:
+                partners[name] = AMBIGUOUS_SUPPLIER
+            else:
+                partners[name] = candidates and candidates.pop() or False
+
+    @api.multi
+    def _parse_bid_row(self, row, lookups):
+        """Return (partner_id, requisition_line_id, values) for a row, or
+        raise ValueError with the reason why the row cannot be imported"""
+        partner_id = lookups['partners'].get(row.get('supplier'))
+        if not partner_id:
+            raise ValueError(_('Unknown supplier'))
+        if partner_id == AMBIGUOUS_SUPPLIER:
+            raise ValueError(_('Several suppliers match this name'))
+        if partner_id in lookups['unsent_partners']:
+            raise ValueError(_('The RFQ of this supplier is not sent yet'))
+        if partner_id in lookups['closed_partners']:
+            raise ValueError(_('The bid of this supplier is already '
+                               'encoded'))
+        line_id = False
+        by_id = False
+        if row.get('line_id'):
+            try:
+                line_id = lookups['lines_by_id'].get(int(row['line_id']))
+                by_id = True
+            except (TypeError, ValueError):
+                # not an id, the line is found by its product code
+                pass
+        if not by_id and row.get('product_code'):
+            line_id = lookups['lines_by_code'].get(row['product_code'])
+        if not line_id:
+            raise ValueError(_('No matching call for bids line'))
+        try:
+            values = {'price_unit': float(row.get('price_unit') or 0.0)}
+            if row.get('quantity') is not None:
+                values['quantity_bid'] = float(row['quantity'])
+        except (TypeError, ValueError):
+            raise ValueError(_('Invalid price or quantity'))
+        if row.get('date_planned'):
+            values['date_planned'] = '%s' % row['date_planned']
+        return partner_id, line_id, values
+
+    @api.multi
+    def _import_bid_batch(self, batch, lookups, unmatched):
+        """Import a batch of rows: create the missing bids, then update the
+        bid lines with one write per distinct set of values.
+
+        Return the ids of the bids and the number of imported rows.
+        """
+        self.ensure_one()
+        self._resolve_bid_suppliers(
+            [row['supplier'] for __, row in batch if row.get('supplier')],
+            lookups)
+        parsed = []
+        for number, row in batch:
+            try:
+                parsed.append(self._parse_bid_row(row, lookups))
+            except ValueError as e:
+                if unmatched is not None:
+                    unmatched(number, row, e.args[0])
+        if not parsed:
+            return set(), 0
+
+        orders = lookups['orders']
+        for partner_id in set(p[0] for p in parsed) - set(orders):
+            res = self.with_context(draft_bid=True).make_purchase_order(
+                partner_id)
+            orders[partner_id] = res[self.id]
+
+        order_ids = set(orders[p[0]] for p in parsed)
+        self.env.cr.execute("""
+            SELECT order_id, requisition_line_id, id
+            FROM purchase_order_line
+            WHERE order_id IN %s
+              AND requisition_line_id IN %s
+        """, (tuple(order_ids), tuple(set(p[1] for p in parsed))))
+        bid_lines = dict(((order_id, line_id), bid_line_id)
+                         for order_id, line_id, bid_line_id
+                         in self.env.cr.fetchall())
+
+        BidLine = self.env['purchase.order.line']
+        Order = self.env['purchase.order']
+        ReqLine = self.env['purchase.requisition.line']
+        by_values = {}
+        for partner_id, line_id, values in parsed:
+            order_id = orders[partner_id]
+            bid_line_id = bid_lines.get((order_id, line_id))
+            if not bid_line_id:
+                order = Order.browse(order_id)
+                line_values = self._prepare_purchase_order_line(
+                    self, ReqLine.browse(line_id), order_id, order.partner_id)
+                bid_line_id = BidLine.create(line_values).id
+                bid_lines[(order_id, line_id)] = bid_line_id
+            key = tuple(sorted(values.iteritems()))
+            by_values.setdefault(key, []).append(bid_line_id)
+        for key, bid_line_ids in by_values.iteritems():
+            BidLine.browse(bid_line_ids).write(dict(key))
+        return order_ids, len(parsed)
+
+    @api.multi
+    def import_bids(self, rows, batch_size=500, unmatched=None):
+        """Encode the bids of a call for bids from an iterable of rows.
+
+        Each row is a dictionary with:
+
+        * supplier: reference or name of the supplier
+        * line_id: id of the call for bids line, or else
+        * product_code: internal reference of the product of the line
+        * price_unit: price of the bid
+        * quantity: quantity offered, optional
+        * date_planned: scheduled date, optional
+
+        The rows are consumed in batches of batch_size, so the memory used
+        does not depend on the number of rows. The suppliers without a bid
+        get a draft bid, then all the bids are marked as received at once.
+        The rows that cannot be imported are given to the unmatched callback
+        with their row number and the reason.
+
+        :returns: dictionary with the number of rows, imported and unmatched
+                  rows and the ids of the bids
+
+        """
+        self.ensure_one()
+        lookups = self._bid_import_lookups()
+        stats = {'rows': 0, 'imported': 0, 'unmatched': 0}
+        order_ids = set()
+
+        def report(number, row, reason):
+            stats['unmatched'] += 1
+            if unmatched is not None:
+                unmatched(number, row, reason)
+
+        def flush(batch):
+            ids, imported = self._import_bid_batch(batch, lookups, report)
+            order_ids.update(ids)
+            stats['imported'] += imported
+            self.env.invalidate_all()
+
+        batch = []
+        # the first row of the file is the header
+        for number, row in enumerate(rows, 2):
+            stats['rows'] += 1
+            batch.append((number, row))
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+        bids = self.env['purchase.order'].browse(list(order_ids))
+        bids._receive_imported_bids()
+        stats['order_ids'] = bids.ids
+        return stats
+
+
+class PurchaseOrder(models.Model):
+    _inherit = 'purchase.order'
+
+    @api.multi
+    def _receive_imported_bids(self):
+        """Mark the imported bids as received, like bid_received_ok does for
+        one bid, with one write for all of them"""
+        bids = self.filtered(lambda bid: bid.state in OPEN_BID_STATES)
+        if not bids:
+            return
+        bids.write({'bid_date': fields.Datetime.now()})
+        bids._post_chatter(_("Bid received and encoded"))
+        bids.signal_workflow('bid_received')
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+#
+#
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+import math
+
+from openerp import models, fields, api
+from openerp.tools.float_utils import float_compare
+import openerp.addons.decimal_precision as dp
+
+
+def greedy_bid_selection(needs, candidates, caps=None, precision=2):
+    """Choose the bid lines that cover the needs at the lowest cost.
+
+    :param needs: dictionary {requisition_line_id: quantity to source}
+    :param candidates: list of tuples (bid_line_id, requisition_line_id,
+                       partner_id, offered quantity, normalised unit price)
+    :param caps: optional dictionary {partner_id: maximum amount}
+    :param precision: number of digits of the quantities
+
+    The lines whose cheapest bid is the most ahead of the second cheapest
+    one are served first, so that capped suppliers are kept for the lines
+    where they make the biggest difference. Each line then takes the
+    cheapest bids until it is covered.
+
+    :returns: a tuple (allocation, uncovered) where allocation is a
+              dictionary {bid_line_id: quantity} and uncovered a
+              dictionary {requisition_line_id: missing quantity}
+
+    """
+    caps = dict(caps or {})
+    by_line = {}
+    for candidate in candidates:
+        by_line.setdefault(candidate[1], []).append(candidate)
+    for line_candidates in by_line.itervalues():
+        line_candidates.sort(key=lambda c: (c[4], c[0]))
+
+    def regret(line_id):
+        prices = [c[4] for c in by_line.get(line_id, [])[:2]]
+        if len(prices) < 2:
+            return float('inf') if prices else 0.0
+        return prices[1] - prices[0]
+
+    allocation = {}
+    uncovered = {}
+    for line_id in sorted(needs, key=lambda l: (-regret(l), l)):
+        remaining = needs[line_id]
+        for bid_line_id, __, partner_id, offered_qty, price in by_line.get(
+                line_id, []):
+            if float_compare(remaining, 0, precision_digits=precision) <= 0:
+                break
+            qty = min(remaining, offered_qty)
+            if partner_id in caps and price > 0:
+                factor = 10 ** precision
+                qty = min(qty, math.floor(caps[partner_id] / price * factor) /
+                          factor)
+            if float_compare(qty, 0, precision_digits=precision) <= 0:
+                continue
+            allocation[bid_line_id] = qty
+            remaining -= qty
+            if partner_id in caps:
+                caps[partner_id] -= qty * price
+        if float_compare(remaining, 0, precision_digits=precision) > 0:
+            uncovered[line_id] = remaining
+    return allocation, uncovered
+
+
+class PurchaseRequisition(models.Model):
+    _inherit = 'purchase.requisition'
+
+    @api.multi
+    def _bid_selection_candidates(self):
+        """Return the bid lines that may be selected, in one query, as tuples
+        (bid_line_id, requisition_line_id, partner_id, offered quantity,
+        normalised unit price).
+
+        Only the priced draft lines of received bids that are eligible, meet
+        the specifications and are still valid are candidates: the lines of
+        a bid are created without price, a line left at 0 is not quoted.
+        The offered quantity is the quantity bid by the supplier, or else
+        the quantity of the line.
+        """
+        self.ensure_one()
+        self.env['purchase.order.line'].check_access_rights('read')
+        self.env.cr.execute("""
+            SELECT pol.id, pol.requisition_line_id, po.partner_id,
+                   COALESCE(NULLIF(pol.quantity_bid, 0), pol.product_qty),
+                   pol.price_unit_co
+            FROM purchase_order_line pol
+            JOIN purchase_order po ON po.id = pol.order_id
+            WHERE po.requisition_id = %s
+              AND po.type = 'bid'
+              AND po.state = 'bid'
+              AND po.bid_eligible
+              AND po.meets_specifications
+              AND (po.bid_validity IS NULL OR po.bid_validity >= %s)
+              AND pol.state = 'draft'
+              AND pol.requisition_line_id IS NOT NULL
+              AND pol.price_unit > 0
+              AND pol.price_unit_co IS NOT NULL
+        """, (self.id, fields.Date.context_today(self)))
+        return self.env.cr.fetchall()
+
+    @api.multi
+    def propose_bid_selection(self, supplier_caps=None):
+        """Propose the selection of bid lines of minimal total cost.
+
+        :param supplier_caps: optional dictionary {partner_id: maximum
+                              amount in the currency of the call for bids}
+        :returns: a dictionary with allocation {bid_line_id: quantity},
+                  uncovered {requisition_line_id: missing quantity} and
+                  total_cost
+
+        """
+        self.ensure_one()
+        precision = self.env['decimal.precision'].precision_get(
+            'Product Unit of Measure')
+        needs = {}
+        for line in self.line_ids:
+            qty = line.product_qty - line.sourced_qty
+            if float_compare(qty, 0, precision_digits=precision) > 0:
+                needs[line.id] = qty
+        candidates = self._bid_selection_candidates()
+        allocation, uncovered = greedy_bid_selection(
+            needs, candidates, caps=supplier_caps, precision=precision)
+        prices = dict((c[0], c[4]) for c in candidates)
+        return {
+            'allocation': allocation,
+            'uncovered': uncovered,
+            'total_cost': sum(qty * prices[bid_line_id]
+                              for bid_line_id, qty in allocation.iteritems()),
+        }
+
+    @api.multi
+    def apply_bid_selection(self, allocation):
+        """Confirm the proposed bid lines with their quantities, with one
+        write per distinct quantity and one confirmation for all lines.
+
+        The allocated quantities are stored as selected quantities, the
+        quantities bid by the suppliers are kept. The lines without quantity
+        bid get theirs beforehand: action_confirm of purchase_requisition
+        writes the quantity of a line without quantity bid on all the lines
+        confirmed with it.
+        """
+        self.ensure_one()
+        BidLine = self.env['purchase.order.line']
+        by_qty = {}
+        for bid_line_id, qty in allocation.iteritems():
+            by_qty.setdefault(qty, []).append(bid_line_id)
+        for qty, bid_line_ids in by_qty.iteritems():
+            BidLine.browse(bid_line_ids).write({'quantity_selected': qty})
+        bid_lines = BidLine.browse(allocation.keys())
+        by_product_qty = {}
+        for bid_line in bid_lines.filtered(lambda l: not l.quantity_bid):
+            by_product_qty.setdefault(bid_line.product_qty, []).append(
+                bid_line.id)
+        for qty, bid_line_ids in by_product_qty.iteritems():
+            BidLine.browse(bid_line_ids).write({'quantity_bid': qty})
+        if bid_lines:
+            bid_lines.action_confirm()
+        return bid_lines
+
+    def _prepare_po_line_from_tender(self, cr, uid, tender, line,
+                                     purchase_id, context=None):
+        """Order the quantity selected by the bid selection proposal"""
+        res = super(PurchaseRequisition, self)._prepare_po_line_from_tender(
+            cr, uid, tender, line, purchase_id, context=context)
+        if line.quantity_selected:
+            res['product_qty'] = line.quantity_selected
+        return res
+
+
+class PurchaseOrderLine(models.Model):
+    _inherit = 'purchase.order.line'
+
+    quantity_selected = fields.Float(
+        'Quantity Selected',
+        digits=dp.get_precision('Product Unit of Measure'),
+        readonly=True,
+        copy=False,
+        help="Quantity allocated to this bid line by the bid selection "
+             "proposal. When set, it is ordered instead of the quantity "
+             "bid.")
+
+    @api.multi
+    def action_draft(self):
+        """Forget the selected quantity of the lines that are unselected"""
+        self.write({'quantity_selected': 0.0})
+        return super(PurchaseOrderLine, self).action_draft()
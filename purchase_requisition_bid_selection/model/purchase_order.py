@@ -90,21 +90,44 @@ class PurchaseOrder(models.Model):
 class PurchaseOrderLineClassic(osv.orm.Model):
     _inherit = "purchase.order.line"
 
-    def read_group(self, *args, **kwargs):
-        """Do not aggregate price and qty. We need to do it this way as there
-        is no group_operator that can be set to prevent aggregating float"""
-
-        result = super(PurchaseOrderLineClassic, self).read_group(*args,
-                                                                  **kwargs)
-
-        for res in result:
-            if 'price_unit' in res:
-                del res['price_unit']
-            if 'product_qty' in res:
-                del res['product_qty']
-            if 'lead_time' in res:
-                del res['lead_time']
-        return result
+    # numeric fields that make no sense summed up in grouped views
+    _no_aggregate_fields = ('price_unit', 'product_qty', 'lead_time')
+
+    def _auto_init(self, cr, context=None):
+        """Index the normalised price of the bid lines within their call
+        for bids line, used to rank the bids"""
+        res = super(PurchaseOrderLineClassic, self)._auto_init(
+            cr, context=context)
+        cr.execute("""
+            SELECT indexname FROM pg_indexes
+            WHERE indexname = 'purchase_order_line_req_line_price_co_index'
+        """)
+        if not cr.fetchone():
+            cr.execute("""
+                CREATE INDEX purchase_order_line_req_line_price_co_index
+                ON purchase_order_line (requisition_line_id, price_unit_co)
+                WHERE requisition_line_id IS NOT NULL
+            """)
+        return res
+
+    def read_group(self, cr, uid, domain, fields, groupby, offset=0,
+                   limit=None, context=None, orderby=False, lazy=True):
+        """Do not aggregate price and qty. There is no group_operator that
+        prevents aggregating a float, so the fields are removed before the
+        query is built and the database does not compute aggregates only to
+        throw them away"""
+        if not fields:
+            fields = [name for name, field in self._fields.iteritems()
+                      if field.store]
+        groupby_list = [groupby] if isinstance(groupby, basestring) \
+            else list(groupby or [])
+        groupby_fields = set(g.split(':')[0] for g in groupby_list)
+        fields = [f for f in fields
+                  if f.split(':')[0] not in self._no_aggregate_fields or
+                  f.split(':')[0] in groupby_fields] or ['id']
+        return super(PurchaseOrderLineClassic, self).read_group(
+            cr, uid, domain, fields, groupby, offset=offset, limit=limit,
+            context=context, orderby=orderby, lazy=lazy)
 
 
 class PurchaseOrderLine(models.Model):
@@ -18,12 +18,13 @@
 #
 #
 
-from openerp import models, fields, api, osv
+from openerp import models, fields, api, osv, tools
 from openerp.exceptions import except_orm
 import openerp.osv.expression as expression
 from openerp.tools.safe_eval import safe_eval
 from openerp.tools.translate import _
 from openerp.tools.float_utils import float_compare
+import openerp.addons.decimal_precision as dp
 
 
 class PurchaseRequisitionClassic(osv.orm.Model):
@@ -161,6 +162,17 @@ class PurchaseRequisition(models.Model):
             values['pricelist_id'] = requisition.pricelist_id.id
         return values
 
+    @api.multi
+    def make_purchase_order(self, partner_id):
+        """The lines of the RFQs generated by one call share the results of
+        the product onchange (see onchange_product_memo in
+        purchase_rfq_bid_workflow)"""
+        if 'onchange_product_memo' in self.env.context:
+            return super(PurchaseRequisition, self).make_purchase_order(
+                partner_id)
+        return super(PurchaseRequisition, self.with_context(
+            onchange_product_memo={})).make_purchase_order(partner_id)
+
     @api.model
     def _prepare_purchase_order_line(self, requisition, requisition_line,
                                      purchase_id, supplier):
@@ -193,18 +205,75 @@ class PurchaseRequisition(models.Model):
         return result
 
     @api.multi
-    def generate_po(self):
-        self.ensure_one()
+    def _generate_po_bulk(self):
+        """Generate the POs of the selected bid lines.
+
+        This replaces the core generator: the confirmed bid lines are
+        grouped by supplier and pricelist, and each PO is created with all
+        its lines in one call. Flags are set with one write per recordset.
 
-        for po_line in self.po_line_ids:
-            # set bid selected boolean to true on RFQ containing confirmed
-            # lines
-            if (po_line.state == 'confirmed' and
-                    not po_line.order_id.bid_partial):
-                po_line.order_id.bid_partial = True
+        :returns: the generated POs
 
-        result = super(PurchaseRequisition, self).generate_po()
+        """
+        self.ensure_one()
+        if self.state == 'done':
+            raise except_orm(
+                _('Warning!'),
+                _('You have already generate the purchase order(s).'))
+        PO = self.env['purchase.order']
+
+        confirmed_lines = self.po_line_ids.filtered(
+            lambda rec: rec.state == 'confirmed')
+        if not confirmed_lines:
+            raise except_orm(
+                _('Warning!'),
+                _('You have no line selected for buying.'))
+
+        # set bid selected boolean to true on RFQ containing confirmed lines
+        confirmed_lines.mapped('order_id').filtered(
+            lambda rec: not rec.bid_partial).write({'bid_partial': True})
+
+        valid_quotations = self.purchase_ids.filtered(
+            self.check_valid_quotation)
+        if valid_quotations:
+            valid_quotations.signal_workflow('purchase_confirm')
+
+        lines_per_supplier = {}
+        for po_line in confirmed_lines:
+            # only the lines of bids that are not confirmed yet
+            if po_line.order_id.state in ['draft', 'sent', 'bid']:
+                key = (po_line.partner_id.id,
+                       po_line.order_id.pricelist_id.id)
+                lines_per_supplier.setdefault(key, [])
+                lines_per_supplier[key].append(po_line)
+
+        new_pos = PO.browse()
+        for (__, pricelist_id), po_lines in lines_per_supplier.iteritems():
+            quotation = po_lines[0].order_id
+            default = self._prepare_po_from_tender(self)
+            default['order_line'] = []
+            for po_line in po_lines:
+                line_default = self._prepare_po_line_from_tender(
+                    self, po_line, False)
+                line_default.pop('order_id', None)
+                line_values = po_line.copy_data(default=line_default)[0]
+                line_values.pop('order_id', None)
+                default['order_line'].append((0, 0, line_values))
+            new_pos |= quotation.with_context(
+                force_requisition_id=True).copy(default=default)
+
+        new_pos.signal_workflow('purchase_confirm')
+        self.cancel_unconfirmed_quotations(self)
+        self.signal_workflow('done')
         self.generated_order_ids.write({'keep_in_draft': False})
+        return new_pos
+
+    @api.multi
+    def generate_po(self):
+        """Generate the POs in bulk and show them"""
+        new_pos = self._generate_po_bulk()
+        result = self.open_po()
+        result['domain'] = [('id', 'in', new_pos.ids)]
         return result
 
     @api.model
@@ -223,17 +292,20 @@ class PurchaseRequisition(models.Model):
         """
         Called from generate_po. Cancel only draft and sent rfq
         """
-        tender.refresh()
-        for quotation in tender.purchase_ids:
-            if quotation.state in ['draft', 'sent', 'draftbid', 'bid']:
-                if self.quotation_selected(quotation):
-                    quotation.signal_workflow('select_requisition')
-                else:
-                    quotation.signal_workflow('purchase_cancel')
-                    quotation.message_post(
-                        body=_('Canceled by the call for bids associated '
-                               'to this request for quotation.'))
-
+        # only forget what generate_po may have changed, not the whole cache
+        tender.invalidate_cache(['purchase_ids'], tender.ids)
+        self.env['purchase.order'].invalidate_cache(
+            ['state', 'bid_partial'], tender.purchase_ids.ids)
+        quotations = tender.purchase_ids.filtered(
+            lambda rec: rec.state in ['draft', 'sent', 'draftbid', 'bid'])
+        selected = quotations.filtered(self.quotation_selected)
+        to_cancel = quotations - selected
+        # signal_workflow sends the signal record by record
+        selected.signal_workflow('select_requisition')
+        to_cancel.signal_workflow('purchase_cancel')
+        to_cancel._post_chatter(
+            _('Canceled by the call for bids associated '
+              'to this request for quotation.'))
         return True
 
     @api.multi
@@ -253,8 +325,7 @@ class PurchaseRequisition(models.Model):
             reason = self.env.ref(
                 'purchase_rfq_bid_workflow.'
                 'purchase_cancel_reason_rfq_canceled')
-            pos_to_cancel.write({'cancel_reason': reason.id})
-            pos_to_cancel.action_cancel()
+            self._cancel_po_with_reason(pos_to_cancel, reason.id)
         if not rfq_valid:
             raise except_orm(
                 _('Error'), _('You do not have valid sent RFQs.'))
@@ -279,7 +350,7 @@ class PurchaseRequisition(models.Model):
         :returns: cancel po record list
 
         """
-        po_list.write({'cancel_reason': reason_id})
+        po_list.write({'cancel_reason_id': reason_id})
         po_list.signal_workflow('purchase_cancel')
         return po_list
 
@@ -365,18 +436,9 @@ class PurchaseRequisition(models.Model):
         Check all quantities have been sourced
         """
         self.ensure_one()
-        dp_obj = self.env['decimal.precision']
-        precision = dp_obj.precision_get('Product Unit of Measure')
         for line in self.line_ids:
-            qty = line.product_qty
-            for pol in line.purchase_line_ids:
-                if pol.state == 'confirmed':
-                    qty -= pol.quantity_bid
-            if qty == line.product_qty:
-                break  # nothing selected
-            compare = float_compare(qty, 0, precision_digits=precision)
-            if compare != 0:
-                break  # too much or too few selected
+            if line.sourcing_state != 'sourced':
+                break  # nothing, too much or too few selected
         else:
             return self.ask_selection_reasons()
 
@@ -492,14 +554,157 @@ class PurchaseRequisitionLine(models.Model):
         'requisition_line_id',
         'Bids Lines',
         readonly=True)
+    sourced_qty = fields.Float(
+        'Sourced Quantity',
+        compute='_compute_sourcing',
+        store=True,
+        digits=dp.get_precision('Product Unit of Measure'),
+        help="Quantity of the confirmed bid lines for this line.")
+    sourcing_state = fields.Selection(
+        [('none', 'Not Sourced'),
+         ('partial', 'Partially Sourced'),
+         ('sourced', 'Sourced'),
+         ('over', 'Over Sourced')],
+        'Sourcing Status',
+        compute='_compute_sourcing',
+        store=True)
+
+    @api.multi
+    @api.depends('product_qty',
+                 'purchase_line_ids.state',
+                 'purchase_line_ids.quantity_bid',
+                 'purchase_line_ids.quantity_selected')
+    def _compute_sourcing(self):
+        """Sum the confirmed bid lines of all the lines in one query"""
+        precision = self.env['decimal.precision'].precision_get(
+            'Product Unit of Measure')
+        sourced_qties = {}
+        line_ids = tuple(line.id for line in self if line.id)
+        if line_ids:
+            self.env.cr.execute("""
+                SELECT requisition_line_id,
+                       SUM(COALESCE(NULLIF(quantity_selected, 0),
+                                    quantity_bid))
+                FROM purchase_order_line
+                WHERE requisition_line_id IN %s
+                  AND state = 'confirmed'
+                GROUP BY requisition_line_id
+            """, (line_ids,))
+            sourced_qties = dict(self.env.cr.fetchall())
+        for line in self:
+            qty = sourced_qties.get(line.id) or 0.0
+            line.sourced_qty = qty
+            if not qty:
+                line.sourcing_state = 'none'
+                continue
+            compare = float_compare(qty, line.product_qty,
+                                    precision_digits=precision)
+            if compare < 0:
+                line.sourcing_state = 'partial'
+            elif compare > 0:
+                line.sourcing_state = 'over'
+            else:
+                line.sourcing_state = 'sourced'
+
+    @staticmethod
+    def _format_display_name(schedule_date, product_qty, product_name):
+        name = ""
+        if schedule_date:
+            name += '%s ' % schedule_date
+        name += '%s %s' % (product_qty, product_name)
+        return name
+
+    @api.model
+    def _read_display_names(self, ids):
+        """Return the display names of the lines {line_id: name}, reading the
+        dates, quantities and translated product names in one query"""
+        if not ids:
+            return {}
+        self.env.cr.execute("""
+            SELECT prl.id, prl.schedule_date, prl.product_qty,
+                   COALESCE(tr.value, pt.name)
+            FROM purchase_requisition_line prl
+            LEFT JOIN product_product pp ON pp.id = prl.product_id
+            LEFT JOIN product_template pt ON pt.id = pp.product_tmpl_id
+            LEFT JOIN ir_translation tr
+                ON tr.res_id = pt.id
+               AND tr.name = 'product.template,name'
+               AND tr.type = 'model'
+               AND tr.lang = %s
+               AND tr.value != ''
+            WHERE prl.id IN %s
+        """, (self.env.lang or 'en_US', tuple(ids)))
+        return dict((line_id, self._format_display_name(date, qty,
+                                                        product_name))
+                    for line_id, date, qty, product_name
+                    in self.env.cr.fetchall())
+
+    @tools.ormcache_multi(skiparg=3, multi=4)
+    def _cached_display_names(self, cr, uid, lang, ids):
+        return self.browse(cr, uid, ids, context={'lang': lang}
+                           )._read_display_names(ids)
+
+    @api.model
+    def _display_name_cache_enabled(self):
+        return bool(safe_eval(self.env['ir.config_parameter'].get_param(
+            'purchase_requisition_bid_selection.cache_line_name', 'False')))
 
     @api.multi
     def name_get(self):
+        """Compute the names of all the lines in one query.
+
+        When the system parameter
+        ``purchase_requisition_bid_selection.cache_line_name`` is true, the
+        names are kept in a cache, cleared when a line or the name of a
+        product is modified.
+        """
+        self.check_access_rights('read')
+        self.check_access_rule('read')
+        ids = [line_id for line_id in self.ids
+               if isinstance(line_id, (int, long))]
+        if ids and self._display_name_cache_enabled():
+            names = self._cached_display_names(self.env.lang or 'en_US', ids)
+        else:
+            names = self._read_display_names(ids)
         res = []
         for line in self:
-            name = ""
-            if line.schedule_date:
-                name += '%s ' % line.schedule_date
-            name += '%s %s' % (line.product_qty, line.product_id.name)
-            res.append((line.id, name))
+            if line.id in names:
+                res.append((line.id, names[line.id]))
+            else:
+                # not saved yet
+                res.append((line.id, self._format_display_name(
+                    line.schedule_date, line.product_qty,
+                    line.product_id.name)))
+        return res
+
+    @api.model
+    def name_search(self, name='', args=None, operator='ilike', limit=100):
+        args = list(args or [])
+        if name:
+            args.append(('product_id', operator, name))
+        return self.search(args, limit=limit).name_get()
+
+    @api.multi
+    def write(self, vals):
+        res = super(PurchaseRequisitionLine, self).write(vals)
+        if set(vals) & set(['schedule_date', 'product_qty', 'product_id']):
+            self._cached_display_names.clear_cache(self)
+        return res
+
+    @api.multi
+    def unlink(self):
+        res = super(PurchaseRequisitionLine, self).unlink()
+        self._cached_display_names.clear_cache(self)
+        return res
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    @api.multi
+    def write(self, vals):
+        res = super(ProductTemplate, self).write(vals)
+        if 'name' in vals:
+            Line = self.env['purchase.requisition.line']
+            Line._cached_display_names.clear_cache(Line)
         return res
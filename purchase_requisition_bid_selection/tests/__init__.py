@@ -2,3 +2,7 @@
 from . import test_cancel_purchase_requisition
 from . import test_generate_po
 from . import test_purchase_requisition_line
+from . import test_bid_comparison
+from . import test_bid_optimizer
+from . import test_purchase_order_line
+from . import test_bid_import
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#
+#
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+"""Compare the cancellation of the quotations of a tender with the notes
+posted one by one and with the notes deferred to the chatter queue, then
+posted in one batch at the end.
+
+Both sides send the workflow signal quotation by quotation, signal_workflow
+loops over the records, so only the posting of the notes differs.
+
+This is not part of the test suite. Run it on a database where the module is
+installed with the demo data:
+
+    python benchmark_cancel_quotations.py -c /path/to/openerp.cfg -d <db>
+
+All the records created by the benchmark are rolled back at the end.
+
+"""
+import sys
+import time
+
+import openerp
+from openerp import SUPERUSER_ID, api
+from openerp.modules.registry import RegistryManager
+from openerp.tools.translate import _
+
+SIZES = (50, 300, 1000)
+
+
+def create_tender(env, count):
+    """Create a tender with count draft RFQs"""
+    partner = env.ref('base.res_partner_12')
+    tender = env['purchase.requisition'].create({
+        'pricelist_id': env.ref('purchase.list0').id,
+    })
+    for __ in xrange(count):
+        env['purchase.order'].create({
+            'partner_id': partner.id,
+            'location_id': env.ref('stock.stock_location_stock').id,
+            'pricelist_id': partner.property_product_pricelist_purchase.id,
+            'requisition_id': tender.id,
+        })
+    return tender
+
+
+def cancel_one_by_one(tender):
+    for quotation in tender.purchase_ids:
+        quotation.signal_workflow('purchase_cancel')
+        quotation.message_post(
+            body=_('Canceled by the call for bids associated '
+                   'to this request for quotation.'))
+
+
+def cancel_deferring_chatter(tender):
+    quotations = tender.purchase_ids
+    quotations.signal_workflow('purchase_cancel')
+    quotations.with_context(defer_chatter=True)._post_chatter(
+        _('Canceled by the call for bids associated '
+          'to this request for quotation.'))
+    quotations._flush_chatter()
+
+
+def measure(env, count, cancel):
+    tender = create_tender(env, count)
+    env.invalidate_all()
+    start = time.time()
+    cancel(tender)
+    elapsed = time.time() - start
+    assert all(po.state == 'cancel' for po in tender.purchase_ids)
+    return elapsed
+
+
+def main(args):
+    openerp.tools.config.parse_config(args)
+    dbname = openerp.tools.config['db_name']
+    registry = RegistryManager.get(dbname)
+    with api.Environment.manage():
+        cr = registry.cursor()
+        try:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            print('%8s %14s %14s' % ('RFQs', 'one by one', 'deferred'))
+            for count in SIZES:
+                one_by_one = measure(env, count, cancel_one_by_one)
+                deferred = measure(env, count, cancel_deferring_chatter)
+                print('%8d %13.2fs %13.2fs' % (count, one_by_one, deferred))
+        finally:
+            cr.rollback()
+            cr.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
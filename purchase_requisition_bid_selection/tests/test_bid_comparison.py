@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#
+#
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+import openerp.tests.common as common
+from openerp import fields
+
+
+class test_bid_comparison(common.TransactionCase):
+    """ Test the comparison matrix of the bids of a call for bids
+    """
+
+    def setUp(self):
+        super(test_bid_comparison, self).setUp()
+        self.req_line = self.env.ref('purchase_requisition.requisition_line1')
+        self.requisition = self.req_line.requisition_id
+        self.bid_lines = {}
+        for partner_ref, price in (('base.res_partner_12', 120),
+                                   ('base.res_partner_13', 100)):
+            self.bid_lines[self.env.ref(partner_ref).id] = self._create_bid(
+                self.env.ref(partner_ref), price, 'bid')
+
+    def _create_bid(self, partner, price, state):
+        """ Create a bid in the given state with one line at the given
+        price for the call for bids line
+        """
+        bid = self.env['purchase.order'].create({
+            'type': 'bid',
+            'partner_id': partner.id,
+            'location_id': self.env.ref('stock.stock_location_stock').id,
+            'pricelist_id': self.requisition.pricelist_id.id,
+            'requisition_id': self.requisition.id,
+        })
+        bid_line = self.env['purchase.order.line'].create({
+            'order_id': bid.id,
+            'name': '/',
+            'product_id': self.req_line.product_id.id,
+            'product_qty': 5.0,
+            'quantity_bid': 5.0,
+            'price_unit': price,
+            'date_planned': fields.Datetime.now(),
+            'requisition_line_id': self.req_line.id,
+        })
+        bid.state = state
+        return bid_line
+
+    def _cells(self):
+        matrix = self.requisition.get_bid_matrix()
+        line = [l for l in matrix['lines'] if l['id'] == self.req_line.id][0]
+        return dict((cell['order_line_id'], cell) for cell in line['cells'])
+
+    def test_bid_matrix(self):
+        """ The cheapest bid is ranked first and highlighted
+        """
+        matrix = self.requisition.get_bid_matrix()
+        line = [l for l in matrix['lines'] if l['id'] == self.req_line.id][0]
+        cells = dict((cell['partner_id'], cell) for cell in line['cells'])
+        best = cells[self.env.ref('base.res_partner_13').id]
+        other = cells[self.env.ref('base.res_partner_12').id]
+        self.assertEqual(best['bid_rank'], 1)
+        self.assertTrue(best['is_best_bid'])
+        self.assertEqual(other['bid_rank'], 2)
+        self.assertFalse(other['is_best_bid'])
+        self.assertEqual(best['price_unit'], 100)
+
+    def test_bid_matrix_unquoted(self):
+        """ Unpriced lines and bids not received yet are not ranked
+        """
+        partner = self.env['res.partner'].create({'name': 'Late Bidder',
+                                                  'supplier': True})
+        unpriced = self._create_bid(partner, 0.0, 'bid')
+        draft = self._create_bid(partner, 50.0, 'draftbid')
+        cells = self._cells()
+        best = cells[self.bid_lines[self.env.ref('base.res_partner_13').id].id]
+        self.assertEqual(best['bid_rank'], 1)
+        self.assertTrue(best['is_best_bid'])
+        for bid_line in (unpriced, draft):
+            self.assertIsNone(cells[bid_line.id]['bid_rank'])
+            self.assertFalse(cells[bid_line.id]['is_best_bid'])
+
+    def test_bid_matrix_paging(self):
+        """ Lines are paged but the total is always given
+        """
+        matrix = self.requisition.get_bid_matrix(limit=1)
+        self.assertEqual(len(matrix['lines']), 1)
+        self.assertEqual(matrix['total'], len(self.requisition.line_ids))
+
+    def test_csv_export(self):
+        """ The CSV has a header and one row per bid line
+        """
+        csv_data = ''.join(self.requisition.iter_bid_comparison_csv())
+        self.assertEqual(csv_data.count('\n'), 1 + len(self.bid_lines))
+
+    def test_top_bids(self):
+        """ Only the cheapest bid is given for k=1
+        """
+        top = self.requisition.top_bids(k=1)
+        best = self.bid_lines[self.env.ref('base.res_partner_13').id]
+        self.assertEqual([bid[0] for bid in top[self.req_line.id]],
+                         [best.id])
+        self.assertEqual(top[self.req_line.id][0][3], 1)
+
+    def test_top_bids_quoted_only(self):
+        """ Unpriced lines and bids not received yet are not top bids
+        """
+        partner = self.env['res.partner'].create({'name': 'Late Bidder',
+                                                  'supplier': True})
+        self._create_bid(partner, 0.0, 'bid')
+        self._create_bid(partner, 50.0, 'draftbid')
+        top = self.requisition.top_bids(k=1)
+        best = self.bid_lines[self.env.ref('base.res_partner_13').id]
+        self.assertEqual([bid[0] for bid in top[self.req_line.id]],
+                         [best.id])
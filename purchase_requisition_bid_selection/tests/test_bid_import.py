@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+#
+#
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+import base64
+from cStringIO import StringIO
+
+import openerp.tests.common as common
+
+from ..model.bid_import import iter_csv_rows
+from ..wizard.bid_import import b64decode_to_file
+
+
+class test_bid_import(common.TransactionCase):
+    """ Test the import of bids from a supplier spreadsheet
+    """
+
+    def setUp(self):
+        super(test_bid_import, self).setUp()
+        self.req_line = self.env.ref('purchase_requisition.requisition_line1')
+        self.requisition = self.req_line.requisition_id
+        self.supplier = self.env['res.partner'].create({
+            'name': 'Bid Import Supplier',
+            'ref': 'BIS',
+            'supplier': True,
+        })
+
+    def test_csv_rows(self):
+        """ The rows are keyed by the lowercase titles of the header
+        """
+        rows = list(iter_csv_rows(StringIO('Supplier,Line_ID,price_unit\n'
+                                           'BIS,12,3.5\n'
+                                           'BIS,,\n')))
+        self.assertEqual(rows, [
+            {'supplier': u'BIS', 'line_id': u'12', 'price_unit': u'3.5'},
+            {'supplier': u'BIS', 'line_id': None, 'price_unit': None},
+        ])
+
+    def test_import_bids(self):
+        """ A bid is created, encoded and received; other rows are reported
+        """
+        unmatched = []
+        rows = [
+            {'supplier': 'BIS', 'line_id': '%s' % self.req_line.id,
+             'price_unit': '42.0', 'quantity': '3'},
+            {'supplier': 'Nobody', 'line_id': '%s' % self.req_line.id,
+             'price_unit': '1.0'},
+            {'supplier': 'BIS', 'line_id': '0', 'price_unit': '1.0'},
+        ]
+        stats = self.requisition.import_bids(
+            iter(rows), batch_size=2,
+            unmatched=lambda number, row, reason: unmatched.append(number))
+        self.assertEqual(stats['rows'], 3)
+        self.assertEqual(stats['imported'], 1)
+        self.assertEqual(stats['unmatched'], 2)
+        self.assertEqual(unmatched, [3, 4])
+
+        bid = self.env['purchase.order'].browse(stats['order_ids'])
+        self.assertEqual(bid.partner_id, self.supplier)
+        self.assertEqual(bid.state, 'bid')
+        bid_line = bid.order_line.filtered(
+            lambda l: l.requisition_line_id == self.req_line)
+        self.assertEqual(bid_line.price_unit, 42.0)
+        self.assertEqual(bid_line.quantity_bid, 3.0)
+
+    def test_import_unsent_rfq(self):
+        """ A row of a supplier whose RFQ is still a draft is reported
+        """
+        self.requisition.make_purchase_order(self.supplier.id)
+        reasons = []
+        rows = [{'supplier': 'BIS', 'line_id': '%s' % self.req_line.id,
+                 'price_unit': '42.0'}]
+        stats = self.requisition.import_bids(
+            iter(rows),
+            unmatched=lambda number, row, reason: reasons.append(reason))
+        self.assertEqual(stats['imported'], 0)
+        self.assertEqual(reasons, ['The RFQ of this supplier is not sent yet'])
+
+    def test_decode_by_chunks(self):
+        """ The uploaded file is decoded by chunks, line breaks included
+        """
+        content = 'Supplier,Line_ID\n' + 'BIS,1\n' * 5000
+        data = base64.encodestring(content)
+        decoded = StringIO()
+        b64decode_to_file(data, decoded)
+        self.assertEqual(decoded.getvalue(), content)
+
+    def test_ambiguous_supplier(self):
+        """ A name shared by several suppliers is reported, unless only one
+        of them has a quotation on the call for bids
+        """
+        twins = self.env['res.partner']
+        for __ in xrange(2):
+            twins |= self.env['res.partner'].create({
+                'name': 'Bid Import Twin',
+                'supplier': True,
+            })
+        rows = [{'supplier': 'Bid Import Twin',
+                 'line_id': '%s' % self.req_line.id, 'price_unit': '42.0'}]
+        reasons = []
+        stats = self.requisition.import_bids(
+            iter(rows),
+            unmatched=lambda number, row, reason: reasons.append(reason))
+        self.assertEqual(stats['imported'], 0)
+        self.assertEqual(reasons, ['Several suppliers match this name'])
+
+        self.requisition.with_context(draft_bid=True).make_purchase_order(
+            twins[1].id)
+        stats = self.requisition.import_bids(iter(rows))
+        self.assertEqual(stats['imported'], 1)
+        bid = self.env['purchase.order'].browse(stats['order_ids'])
+        self.assertEqual(bid.partner_id, twins[1])
+
+    def test_line_by_product_code(self):
+        """ A line id that is not a number falls back on the product code
+        """
+        self.req_line.product_id.default_code = 'BIDIMPORT'
+        stats = self.requisition.import_bids(iter([
+            {'supplier': 'BIS', 'line_id': 'n/a', 'product_code': 'BIDIMPORT',
+             'price_unit': '42.0'},
+        ]))
+        self.assertEqual(stats['imported'], 1)
+        bid = self.env['purchase.order'].browse(stats['order_ids'])
+        bid_line = bid.order_line.filtered(
+            lambda l: l.requisition_line_id == self.req_line)
+        self.assertEqual(bid_line.price_unit, 42.0)
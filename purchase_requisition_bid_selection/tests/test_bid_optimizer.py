@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+#
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+import openerp.tests.common as common
+
+from ..model.bid_optimizer import greedy_bid_selection
+
+
+class test_bid_optimizer(common.BaseCase):
+    """ Test the proposal of a cost-optimal selection of bids
+    """
+
+    def test_cheapest_bids_cover_the_need(self):
+        """ The cheapest bid is taken first, then the next one
+        """
+        candidates = [(1, 10, 100, 6.0, 5.0),
+                      (2, 10, 200, 10.0, 4.0),
+                      (3, 10, 300, 10.0, 6.0)]
+        allocation, uncovered = greedy_bid_selection({10: 12.0}, candidates)
+        self.assertEqual(allocation, {2: 10.0, 1: 2.0})
+        self.assertEqual(uncovered, {})
+
+    def test_uncovered_need(self):
+        """ What cannot be covered is reported
+        """
+        allocation, uncovered = greedy_bid_selection(
+            {10: 12.0, 20: 1.0}, [(1, 10, 100, 5.0, 5.0)])
+        self.assertEqual(allocation, {1: 5.0})
+        self.assertEqual(uncovered, {10: 7.0, 20: 1.0})
+
+    def test_supplier_cap(self):
+        """ A capped supplier is kept for the line where it saves the most
+        """
+        candidates = [(1, 10, 100, 10.0, 1.0),
+                      (2, 10, 200, 10.0, 1.5),
+                      (3, 20, 100, 10.0, 1.0),
+                      (4, 20, 200, 10.0, 9.0)]
+        allocation, uncovered = greedy_bid_selection(
+            {10: 10.0, 20: 10.0}, candidates, caps={100: 10.0})
+        self.assertEqual(allocation, {3: 10.0, 2: 10.0})
+        self.assertEqual(uncovered, {})
+
+
+class test_bid_selection_apply(common.TransactionCase):
+    """ Test the application of a bid selection proposal
+    """
+
+    def setUp(self):
+        super(test_bid_selection_apply, self).setUp()
+        product = self.env.ref('purchase_requisition.requisition_line1'
+                               ).product_id
+        self.requisition = self.env['purchase.requisition'].create({
+            'line_ids': [(0, 0, {'product_id': product.id,
+                                 'product_qty': qty})
+                         for qty in (10.0, 5.0, 7.0)],
+        })
+        self.line_a, self.line_b, self.line_c = self.requisition.line_ids
+        self.env['res.partner'].create({
+            'name': 'Bid Selection Supplier',
+            'ref': 'BSS',
+            'supplier': True,
+        })
+        # the third line is left unpriced
+        stats = self.requisition.import_bids(iter([
+            {'supplier': 'BSS', 'line_id': '%s' % self.line_a.id,
+             'price_unit': '1.0', 'quantity': '20'},
+            {'supplier': 'BSS', 'line_id': '%s' % self.line_b.id,
+             'price_unit': '2.0'},
+        ]))
+        self.bid = self.env['purchase.order'].browse(stats['order_ids'])
+        self.bid.write({'bid_eligible': True, 'meets_specifications': True})
+        self.bid_lines = dict(
+            (bid_line.requisition_line_id, bid_line)
+            for bid_line in self.bid.order_line)
+
+    def test_unpriced_line(self):
+        """ The bid lines without price are not candidates
+        """
+        proposal = self.requisition.propose_bid_selection()
+        self.assertEqual(proposal['allocation'], {
+            self.bid_lines[self.line_a].id: 10.0,
+            self.bid_lines[self.line_b].id: 5.0,
+        })
+        self.assertEqual(proposal['uncovered'], {self.line_c.id: 7.0})
+
+    def test_keep_quantity_bid(self):
+        """ The allocated quantities are selected, the quantities bid are
+        kept, also when a line of the batch has no quantity bid
+        """
+        proposal = self.requisition.propose_bid_selection()
+        self.requisition.apply_bid_selection(proposal['allocation'])
+        bid_line_a = self.bid_lines[self.line_a]
+        bid_line_b = self.bid_lines[self.line_b]
+        self.assertEqual(bid_line_a.state, 'confirmed')
+        self.assertEqual(bid_line_b.state, 'confirmed')
+        self.assertEqual(bid_line_a.quantity_bid, 20.0)
+        self.assertEqual(bid_line_a.quantity_selected, 10.0)
+        self.assertEqual(bid_line_b.quantity_bid, 5.0)
+        self.assertEqual(bid_line_b.quantity_selected, 5.0)
+        self.assertEqual(self.line_a.sourced_qty, 10.0)
+        self.assertEqual(self.line_b.sourced_qty, 5.0)
+
+    def test_only_received_bids(self):
+        """ The lines of bids that are not received are not candidates
+        """
+        self.bid.state = 'draftbid'
+        proposal = self.requisition.propose_bid_selection()
+        self.assertEqual(proposal['allocation'], {})
@@ -98,3 +98,40 @@ class test_generate_po(common.TransactionCase):
         self.assertEqual(self.bid_selected.state, 'bid_selected')
         self.assertEqual(self.bid.state, 'cancel')
         self.assertEqual(self.draftbid.state, 'cancel')
+        self.assertTrue(any(
+            'Canceled by the call for bids' in (message.body or '')
+            for message in self.bid.message_ids))
+
+    def test_cancel_po_with_reason(self):
+        """ Cancelled quotations get the reason of their cancellation
+        """
+        reason = self.env.ref('purchase_requisition_bid_selection.'
+                              'purchase_cancelreason_callforbids_canceled')
+        self.preq._cancel_po_with_reason(self.draftbid, reason.id)
+        self.assertEqual(self.draftbid.state, 'cancel')
+        self.assertEqual(self.draftbid.cancel_reason_id, reason)
+
+    def test_generate_po_creates_po(self):
+        """ The selected bid line is copied to a new PO and the workflow of
+        the call for bids reaches its done activity
+
+        """
+        result = self.preq.generate_po()
+        new_po = self.preq.generated_order_ids
+        self.assertEqual(len(new_po), 1)
+        self.assertEqual(result['domain'], [('id', 'in', new_po.ids)])
+        self.assertEqual(new_po.partner_id,
+                         self.env.ref('base.res_partner_12'))
+        self.assertEqual(new_po.type, 'purchase')
+        self.assertEqual(len(new_po.order_line), 1)
+        self.assertEqual(new_po.order_line.price_unit, 100)
+        self.assertFalse(new_po.keep_in_draft)
+        self.env.cr.execute("""
+            SELECT item.act_id
+            FROM wkf_instance inst
+            JOIN wkf_workitem item ON item.inst_id = inst.id
+            WHERE inst.res_type = 'purchase.requisition'
+              AND inst.res_id = %s
+        """, (self.preq.id,))
+        self.assertEqual([row[0] for row in self.env.cr.fetchall()],
+                         [self.ref('purchase_requisition.act_done')])
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+#
+#
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+import openerp.tests.common as common
+
+
+class test_purchase_order_line(common.TransactionCase):
+
+    def test_read_group_no_aggregate(self):
+        """ Price and quantity are not aggregated in grouped bid lines
+        """
+        groups = self.env['purchase.order.line'].read_group(
+            [], ['price_unit', 'product_qty', 'price_subtotal_co',
+                 'order_id'],
+            ['order_id'])
+        self.assertTrue(groups)
+        for group in groups:
+            self.assertNotIn('price_unit', group)
+            self.assertNotIn('product_qty', group)
+            self.assertIn('price_subtotal_co', group)
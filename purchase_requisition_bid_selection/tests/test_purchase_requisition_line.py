@@ -1,4 +1,5 @@
 import openerp.tests.common as common
+from openerp import fields
 
 
 class test_purchase_requisition_line(common.TransactionCase):
@@ -10,3 +11,47 @@ class test_purchase_requisition_line(common.TransactionCase):
 
     def test_name_get(self):
         self.assertEqual(u'5.0 RAM SR5', self.reqLine.name_get()[0][1])
+
+    def test_name_get_cached(self):
+        """The cached names are refreshed when the line is modified"""
+        self.env['ir.config_parameter'].set_param(
+            'purchase_requisition_bid_selection.cache_line_name', 'True')
+        self.assertEqual(u'5.0 RAM SR5', self.reqLine.name_get()[0][1])
+        self.reqLine.product_qty = 7.0
+        self.assertEqual(u'7.0 RAM SR5', self.reqLine.name_get()[0][1])
+
+    def test_name_search(self):
+        lines = self.reqLine.requisition_id.line_ids
+        res = lines.name_search('RAM SR5',
+                                args=[('id', 'in', lines.ids)])
+        self.assertIn((self.reqLine.id, u'5.0 RAM SR5'), res)
+
+    def test_sourcing(self):
+        """Only confirmed bid lines count as sourced quantity"""
+        self.assertEqual(self.reqLine.sourcing_state, 'none')
+        requisition = self.reqLine.requisition_id
+        partner = self.env.ref('base.res_partner_12')
+        bid = self.env['purchase.order'].create({
+            'partner_id': partner.id,
+            'location_id': self.env.ref('stock.stock_location_stock').id,
+            'pricelist_id': partner.property_product_pricelist_purchase.id,
+            'requisition_id': requisition.id,
+        })
+        bid_line = self.env['purchase.order.line'].create({
+            'order_id': bid.id,
+            'name': '/',
+            'product_id': self.reqLine.product_id.id,
+            'product_qty': 2.0,
+            'quantity_bid': 2.0,
+            'price_unit': 100,
+            'date_planned': fields.Datetime.now(),
+            'requisition_line_id': self.reqLine.id,
+        })
+        self.assertEqual(self.reqLine.sourced_qty, 0.0)
+
+        bid_line.state = 'confirmed'
+        self.assertEqual(self.reqLine.sourced_qty, 2.0)
+        self.assertEqual(self.reqLine.sourcing_state, 'partial')
+
+        bid_line.quantity_bid = self.reqLine.product_qty
+        self.assertEqual(self.reqLine.sourcing_state, 'sourced')
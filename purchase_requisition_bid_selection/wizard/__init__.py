@@ -2,3 +2,5 @@
 from . import purchase_requisition_partner
 from . import update_bid_internal_remark
 from . import update_remark
+from . import bid_optimizer
+from . import bid_import
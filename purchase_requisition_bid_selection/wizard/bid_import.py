@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import base64
+import csv
+import tempfile
+from cStringIO import StringIO
+
+from openerp import models, api, fields, tools
+from openerp.tools.translate import _
+
+from ..model.bid_import import iter_bid_rows
+
+# characters of base64 data decoded at a time, a multiple of 4
+DECODE_CHUNK_SIZE = 64 * 1024
+
+
+def b64decode_to_file(data, fileobj):
+    """Decode base64 data to a file by chunks, so the decoded content is
+    never held in memory as a whole, even when the data has no line
+    breaks"""
+    pending = ''
+    for start in xrange(0, len(data), DECODE_CHUNK_SIZE):
+        pending += ''.join(data[start:start + DECODE_CHUNK_SIZE].split())
+        usable = len(pending) - len(pending) % 4
+        fileobj.write(base64.b64decode(pending[:usable]))
+        pending = pending[usable:]
+    if pending:
+        fileobj.write(base64.b64decode(pending))
+
+
+class BidImport(models.TransientModel):
+    _name = "purchase.requisition.bid.import"
+    _description = "Import bids from a supplier spreadsheet"
+
+    def get_default_requisition(self):
+        return self.env.context.get('active_id')
+
+    requisition_id = fields.Many2one('purchase.requisition',
+                                     'Call for Bids',
+                                     required=True,
+                                     default=get_default_requisition)
+    data = fields.Binary('File', required=True)
+    filename = fields.Char()
+    state = fields.Selection([('draft', 'Draft'), ('done', 'Done')],
+                             default='draft')
+    imported_count = fields.Integer('Imported Rows', readonly=True)
+    unmatched_count = fields.Integer('Unmatched Rows', readonly=True)
+    report = fields.Binary('Unmatched Rows Report', readonly=True)
+    report_filename = fields.Char()
+
+    @api.multi
+    def import_file(self):
+        """Decode the file to a temporary file and stream its rows to the
+        importer. The unmatched rows are written to a CSV report."""
+        self.ensure_one()
+        with tempfile.TemporaryFile() as source, \
+                tempfile.TemporaryFile() as report:
+            b64decode_to_file(self.data, source)
+            source.seek(0)
+            writer = csv.writer(report)
+            writer.writerow([_('Row'), _('Supplier'), _('Reason')])
+
+            def unmatched(number, row, reason):
+                writer.writerow([number,
+                                 tools.ustr(row.get('supplier') or ''
+                                            ).encode('utf-8'),
+                                 tools.ustr(reason).encode('utf-8')])
+
+            stats = self.requisition_id.import_bids(
+                iter_bid_rows(source, self.filename), unmatched=unmatched)
+            values = {
+                'state': 'done',
+                'imported_count': stats['imported'],
+                'unmatched_count': stats['unmatched'],
+            }
+            if stats['unmatched']:
+                report.seek(0)
+                encoded = StringIO()
+                base64.encode(report, encoded)
+                values.update(report=encoded.getvalue(),
+                              report_filename='unmatched_bids.csv')
+        self.write(values)
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_type': 'form',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': self.env.context,
+        }
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from openerp import models, api, fields
+import openerp.addons.decimal_precision as dp
+
+
+class BidOptimizer(models.TransientModel):
+    _name = "purchase.requisition.bid.optimizer"
+    _description = "Propose a cost-optimal selection of bids"
+
+    def get_default_requisition(self):
+        return self.env.context.get('active_id')
+
+    requisition_id = fields.Many2one('purchase.requisition',
+                                     'Call for Bids',
+                                     required=True,
+                                     default=get_default_requisition)
+    cap_ids = fields.One2many('purchase.requisition.bid.optimizer.cap',
+                              'optimizer_id',
+                              'Supplier Caps')
+    proposal_ids = fields.One2many(
+        'purchase.requisition.bid.optimizer.proposal',
+        'optimizer_id',
+        'Proposed Bid Lines',
+        readonly=True)
+    total_cost = fields.Float(digits=dp.get_precision('Account'),
+                              readonly=True)
+    uncovered = fields.Text('Uncovered Lines', readonly=True)
+
+    @api.multi
+    def propose(self):
+        self.ensure_one()
+        caps = dict((cap.partner_id.id, cap.max_amount)
+                    for cap in self.cap_ids)
+        result = self.requisition_id.propose_bid_selection(
+            supplier_caps=caps)
+        uncovered = self.env['purchase.requisition.line'].browse(
+            result['uncovered'].keys())
+        self.write({
+            'proposal_ids': [(5, 0, 0)] + [
+                (0, 0, {'bid_line_id': bid_line_id, 'quantity': qty})
+                for bid_line_id, qty in result['allocation'].iteritems()
+            ],
+            'total_cost': result['total_cost'],
+            'uncovered': '\n'.join(
+                '%s: %s' % (name, result['uncovered'][line_id])
+                for line_id, name in uncovered.name_get()),
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_type': 'form',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': self.env.context,
+        }
+
+    @api.multi
+    def apply(self):
+        self.ensure_one()
+        self.requisition_id.apply_bid_selection(
+            dict((proposal.bid_line_id.id, proposal.quantity)
+                 for proposal in self.proposal_ids))
+        return {'type': 'ir.actions.act_window_close'}
+
+
+class BidOptimizerCap(models.TransientModel):
+    _name = "purchase.requisition.bid.optimizer.cap"
+
+    optimizer_id = fields.Many2one('purchase.requisition.bid.optimizer',
+                                   required=True,
+                                   ondelete='cascade')
+    partner_id = fields.Many2one('res.partner', 'Supplier', required=True)
+    max_amount = fields.Float('Maximum Amount',
+                              digits=dp.get_precision('Account'),
+                              required=True)
+
+
+class BidOptimizerProposal(models.TransientModel):
+    _name = "purchase.requisition.bid.optimizer.proposal"
+
+    optimizer_id = fields.Many2one('purchase.requisition.bid.optimizer',
+                                   required=True,
+                                   ondelete='cascade')
+    bid_line_id = fields.Many2one('purchase.order.line', 'Bid Line',
+                                  required=True)
+    requisition_line_id = fields.Many2one(
+        related='bid_line_id.requisition_line_id',
+        readonly=True)
+    partner_id = fields.Many2one(related='bid_line_id.partner_id',
+                                 readonly=True)
+    price_unit_co = fields.Float(related='bid_line_id.price_unit_co',
+                                 readonly=True)
+    quantity = fields.Float(
+        digits=dp.get_precision('Product Unit of Measure'))
@@ -25,26 +25,35 @@ import openerp.addons.decimal_precision as dp
 class PurchaseOrderLine(models.Model):
     _inherit = 'purchase.order.line'
 
-    @api.one
+    @api.multi
     @api.depends('price_unit',
                  'price_subtotal',
                  'order_id.pricelist_id.currency_id',
                  'order_id.requisition_id.date_exchange_rate',
                  'order_id.requisition_id.pricelist_id.currency_id')
     def _compute_prices_in_company_currency(self):
-        """ """
-        requisition = self.order_id.requisition_id
-        if requisition and requisition.pricelist_id.currency_id:
-            date = requisition.date_exchange_rate or fields.Date.today()
-            # We take pricelist currency as currency should be related,
-            # but due to odoo issue #4598 currency could mismatch
-            from_curr = self.order_id.pricelist_id.currency_id
-            from_curr = from_curr.with_context(date=date)
-            to_curr = requisition.pricelist_id.currency_id
-            self.price_unit_co = from_curr.compute(self.price_unit,
-                                                   to_curr, round=False)
-            self.price_subtotal_co = from_curr.compute(self.price_subtotal,
-                                                       to_curr, round=False)
+        """Convert the prices of the lines with one rate for each source
+        currency, target currency and date"""
+        today = fields.Date.today()
+        groups = {}
+        for line in self:
+            requisition = line.order_id.requisition_id
+            if requisition and requisition.pricelist_id.currency_id:
+                date = requisition.date_exchange_rate or today
+                # We take pricelist currency as currency should be related,
+                # but due to odoo issue #4598 currency could mismatch
+                from_curr = line.order_id.pricelist_id.currency_id
+                to_curr = requisition.pricelist_id.currency_id
+                key = (from_curr.id, to_curr.id, date)
+                groups.setdefault(key, []).append(line)
+        Currency = self.env['res.currency']
+        for (from_curr_id, to_curr_id, date), lines in groups.iteritems():
+            from_curr = Currency.browse(from_curr_id).with_context(date=date)
+            rate = from_curr.compute(1.0, Currency.browse(to_curr_id),
+                                     round=False)
+            for line in lines:
+                line.price_unit_co = line.price_unit * rate
+                line.price_subtotal_co = line.price_subtotal * rate
 
     price_unit_co = fields.Float(
         compute='_compute_prices_in_company_currency',
@@ -56,6 +56,19 @@ In the scope of international transactions, some fields have been added:
    that applies. This field allows to name the place where the goods will be
    available
 
+Bids whose validity date is over can be canceled with the reason 'Bid validity
+date expired' by the scheduled action 'Cancel expired bids', which is
+inactive by default. A filter lists the bids expiring within 7 days.
+
+The messages logged by the workflow transitions can be deferred, either with
+the key 'defer_chatter' in the context (for mass operations) or with the system
+parameter 'purchase_rfq_bid_workflow.defer_chatter'. They are then queued with
+one query per transition. A mass operation deferring them with the context
+posts them at its end. With the system parameter, they are posted by the
+scheduled action 'Post queued purchase messages', which is inactive by default:
+the messages are only deferred once it is activated. The batch operations of
+the other purchase modules log their messages through the same queue.
+
 TODO: describe onchange picking type.
 
 Note: for running the tests, the python package nose is required. It is not
@@ -69,6 +82,7 @@ listed as an external dependency because it is not needed in production.
              "view/purchase_cancel.xml",
              "data/purchase_order.xml",
              "data/purchase_cancel_reason.yml",
+             "data/purchase_order_cron.xml",
              "workflow/purchase_order.xml",
              "wizard/modal.xml",
              "wizard/action_cancel_reason.xml",
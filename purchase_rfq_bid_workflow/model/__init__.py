@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 from . import purchase_order
 from . import purchase_cancel
+from . import chatter_queue
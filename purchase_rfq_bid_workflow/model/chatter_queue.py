@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+import logging
+from collections import OrderedDict
+
+from openerp import models, fields, api
+from openerp.tools.safe_eval import safe_eval
+
+_logger = logging.getLogger(__name__)
+
+DEFER_CHATTER_PARAM = 'purchase_rfq_bid_workflow.defer_chatter'
+FLUSH_CRON = 'purchase_rfq_bid_workflow.ir_cron_flush_chatter_queue'
+
+
+class PurchaseOrderChatterQueue(models.Model):
+    """Messages of the purchase workflow waiting to be posted.
+
+    The workflow transitions add their messages here when the chatter is
+    deferred, so that the business transaction only pays one insert. The
+    messages are posted later by flush_chatter_queue.
+    """
+    _name = 'purchase.order.chatter.queue'
+    _description = 'Purchase Chatter Queue'
+    _order = 'id'
+
+    order_id = fields.Many2one('purchase.order', 'Order', required=True,
+                               ondelete='cascade')
+    body = fields.Html(required=True)
+    subtype = fields.Char(help="XML id of the subtype of the message")
+    author_id = fields.Many2one('res.partner', 'Author')
+
+    @api.model
+    def enqueue(self, orders, body, subtype=None):
+        """Queue the same message for many orders with one query"""
+        if not orders:
+            return
+        author_id = self.env.user.partner_id.id
+        rows = [(order.id, body, subtype, author_id,
+                 self.env.uid, self.env.uid)
+                for order in orders]
+        query = """
+            INSERT INTO purchase_order_chatter_queue
+                (order_id, body, subtype, author_id, create_uid, write_uid,
+                 create_date, write_date)
+            VALUES %s
+        """ % ', '.join(
+            ["(%s, %s, %s, %s, %s, %s, "
+             "(now() at time zone 'UTC'), (now() at time zone 'UTC'))"] *
+            len(rows))
+        self.env.cr.execute(query, [value for row in rows for value in row])
+
+    @api.model
+    def flush_chatter_queue(self, limit=1000, orders=None):
+        """Post the queued messages, the oldest first.
+
+        Called by the scheduler, or at the end of a mass operation with the
+        orders it changed. The messages keep the author and the date at which
+        they were queued. They are grouped by body, subtype and author, so
+        the subtype is looked up once per group.
+
+        Return the number of posted messages.
+        """
+        domain = []
+        if orders is not None:
+            domain = [('order_id', 'in', orders.ids)]
+        entries = self.search(domain, limit=limit)
+        if not entries:
+            return 0
+        groups = OrderedDict()
+        for entry in entries.read(['order_id', 'body', 'subtype',
+                                   'author_id', 'create_date'],
+                                  load='_classic_write'):
+            key = (entry['body'], entry['subtype'], entry['author_id'])
+            groups.setdefault(key, []).append((entry['order_id'],
+                                               entry['create_date']))
+        Order = self.env['purchase.order']
+        IrModelData = self.env['ir.model.data']
+        for (body, subtype, author_id), posts in groups.iteritems():
+            subtype = subtype or 'mail.mt_note'
+            if '.' not in subtype:
+                subtype = 'mail.%s' % subtype
+            subtype_id = IrModelData.xmlid_to_res_id(subtype)
+            for order_id, date in posts:
+                Order.browse(order_id).message_post(
+                    body=body, subtype_id=subtype_id, author_id=author_id,
+                    date=date)
+        count = len(entries)
+        entries.unlink()
+        _logger.debug('%d queued purchase messages posted', count)
+        return count
+
+
+class PurchaseOrder(models.Model):
+    _inherit = 'purchase.order'
+
+    @api.model
+    def _defer_chatter(self):
+        """Whether the messages are queued instead of posted.
+
+        With the defer_chatter key of the context, the caller posts the
+        queued messages at the end of its operation with _flush_chatter. The
+        system parameter only defers them while the scheduled action that
+        posts them is active, otherwise they would stay in the queue.
+        """
+        if 'defer_chatter' in self._context:
+            return self._context['defer_chatter']
+        if not safe_eval(self.env['ir.config_parameter'].get_param(
+                DEFER_CHATTER_PARAM, 'False')):
+            return False
+        cron = self.env.ref(FLUSH_CRON, raise_if_not_found=False)
+        if not (cron and cron.sudo().active):
+            _logger.warning('%s is set but the scheduled action %s is '
+                            'inactive, the messages are not deferred',
+                            DEFER_CHATTER_PARAM, FLUSH_CRON)
+            return False
+        return True
+
+    @api.multi
+    def _post_chatter(self, body, subtype=None):
+        """Log the message on each order, or queue it when the chatter is
+        deferred with the defer_chatter key of the context or the system
+        parameter purchase_rfq_bid_workflow.defer_chatter"""
+        if not self:
+            return
+        if self._defer_chatter():
+            self.env['purchase.order.chatter.queue'].enqueue(self, body,
+                                                             subtype=subtype)
+            return
+        for order in self:
+            order.message_post(body=body, subtype=subtype)
+
+    @api.multi
+    def _flush_chatter(self):
+        """Post the messages queued for the orders, at the end of a mass
+        operation that deferred them"""
+        return self.env['purchase.order.chatter.queue'].flush_chatter_queue(
+            limit=None, orders=self)
@@ -17,9 +17,23 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 ##############################################################################
+import copy
+import logging
+from datetime import timedelta
+
 from openerp import models, fields, api, exceptions, osv
 from openerp.tools.translate import _
 
+_logger = logging.getLogger(__name__)
+
+# states of the bids that expire when their validity date is over
+EXPIRING_BID_STATES = ('draftbid', 'bid')
+
+# context key of the dictionary in which a batch caller collects the results
+# of the core onchange_product_id, keyed on the arguments of the onchange
+ONCHANGE_MEMO_KEY = 'onchange_product_memo'
+MEMO_CONTEXT_TYPES = (basestring, int, long, float, bool, type(None))
+
 
 class PurchaseOrderClassic(osv.orm.Model):
     _inherit = "purchase.order"
@@ -75,6 +89,22 @@ class PurchaseOrderClassic(osv.orm.Model):
         'state': _default_state,
     }
 
+    def _auto_init(self, cr, context=None):
+        """Index the validity date of the bids, used to find expired bids"""
+        res = super(PurchaseOrderClassic, self)._auto_init(cr,
+                                                           context=context)
+        cr.execute("""
+            SELECT indexname FROM pg_indexes
+            WHERE indexname = 'purchase_order_bid_validity_index'
+        """)
+        if not cr.fetchone():
+            cr.execute("""
+                CREATE INDEX purchase_order_bid_validity_index
+                ON purchase_order (bid_validity)
+                WHERE type = 'bid'
+            """)
+        return res
+
 
 class PurchaseOrder(models.Model):
     _inherit = "purchase.order"
@@ -137,17 +167,29 @@ class PurchaseOrder(models.Model):
         required=True,
         states=STATES)
 
+    @api.multi
+    def _document_description(self):
+        """Name of the kind of document, derived from its type"""
+        self.ensure_one()
+        if self.type == 'bid':
+            return _('Draft Bid')
+        elif self.type == 'rfq':
+            return _('Request for Quotation')
+        return self._description
+
     @api.model
     def create(self, values):
-        # Document can be created as Draft RFQ or Draft PO. We need to log the
-        # right message.
-        description = self._description
-        if self._context.get('draft_bid'):
-            self._description = 'Draft Bid'
-        elif not self._context.get('draft_po'):
-            self._description = 'Request for Quotation'
-        order = super(PurchaseOrder, self).create(values)
-        self._description = description
+        # Document can be created as Draft RFQ, Draft Bid or Draft PO. We
+        # need to log the right message, so the creation is logged here
+        # instead of by mail.thread, which uses the description of the model.
+        log = not self._context.get('mail_create_nolog')
+        order = super(PurchaseOrder,
+                      self.with_context(mail_create_nolog=True)
+                      ).create(values)
+        order = self.browse(order.id)
+        if log:
+            order.message_post(
+                body=_('%s created') % order._document_description())
         if self._context.get('draft_bid'):
             order.signal_workflow('draft_bid')
         if self._context.get('draft_po'):
@@ -171,8 +213,8 @@ class PurchaseOrder(models.Model):
 
     @api.multi
     def wkf_draft_po(self):
-        self.message_post(body=_("Converted to draft Purchase Order"),
-                          subtype="mail.mt_comment")
+        self._post_chatter(_("Converted to draft Purchase Order"),
+                           subtype="mail.mt_comment")
         return self.write({'state': 'draftpo', 'type': 'purchase'})
 
     @api.multi
@@ -211,15 +253,19 @@ class PurchaseOrder(models.Model):
 
     @api.multi
     def wkf_action_cancel(self):
+        by_message = {}
         for element in self:
             if element.state in ('draft', 'sent'):
                 message = _("Request for Quotation")
             elif element.state == 'bid':
                 message = _("Bid")
             else:
-                message = self._description
+                message = element._document_description()
             message += " " + _("canceled")
-            element.message_post(body=message, subtype="mail.mt_comment")
+            by_message.setdefault(message, []).append(element.id)
+        for message, element_ids in by_message.iteritems():
+            self.browse(element_ids)._post_chatter(message,
+                                                   subtype="mail.mt_comment")
         return super(PurchaseOrder, self).wkf_action_cancel()
 
     @api.multi
@@ -256,8 +302,8 @@ class PurchaseOrder(models.Model):
 
         self.bid_date = wizard.datetime
 
-        self.message_post(body=_("Bid received and encoded"),
-                          subtype="mail.mt_comment")
+        self._post_chatter(_("Bid received and encoded"),
+                           subtype="mail.mt_comment")
         self.signal_workflow('bid_received')
         return {}
 
@@ -290,10 +336,60 @@ class PurchaseOrder(models.Model):
                 _('Error!'),
                 _('You cannot print a Request for Quotation without any '
                   'product line.'))
-        self.message_post(body=_("Request for Quotation printed"),
-                          subtype="mail.mt_comment")
+        self._post_chatter(_("Request for Quotation printed"),
+                           subtype="mail.mt_comment")
         return super(PurchaseOrder, self).print_quotation()
 
+    @api.model
+    def _expiring_bids_domain(self, days=0):
+        """Domain of the open bids whose validity ends within days days.
+        A negative value gives the bids that are already expired."""
+        today = fields.Date.from_string(fields.Date.context_today(self))
+        limit = fields.Date.to_string(today + timedelta(days=days))
+        domain = [('type', '=', 'bid'),
+                  ('state', 'in', EXPIRING_BID_STATES),
+                  ('bid_validity', '<=', limit)]
+        if days >= 0:
+            domain.append(('bid_validity', '>=', fields.Date.to_string(today)))
+        return domain
+
+    @api.model
+    def search_expiring_bids(self, days=7, limit=None):
+        """Open bids that expire within the next days, the earliest first"""
+        return self.search(self._expiring_bids_domain(days), limit=limit,
+                           order='bid_validity, id')
+
+    @api.model
+    def cancel_expired_bids(self, batch_size=200, autocommit=False):
+        """Cancel the open bids whose validity date is over.
+
+        Called by the scheduler. The bids are canceled by batches of
+        batch_size with the reason 'Bid validity date expired', and each
+        batch is committed when autocommit is set.
+
+        Return the number of canceled bids.
+        """
+        reason = self.env.ref('purchase_rfq_bid_workflow.'
+                              'purchase_cancel_reason_bid_validity_expired')
+        domain = self._expiring_bids_domain(days=-1)
+        count = 0
+        last_id = 0
+        while True:
+            bids = self.search(domain + [('id', '>', last_id)],
+                               limit=batch_size, order='id')
+            if not bids:
+                break
+            last_id = bids[-1].id
+            bids.write({'cancel_reason_id': reason.id})
+            bids.signal_workflow('purchase_cancel')
+            count += len(bids)
+            if autocommit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+        if count:
+            _logger.info('%d expired bids canceled', count)
+        return count
+
     @api.multi
     def po_tender_requisition_selected(self):
         """Workflow function that write state 'bid selected'"""
@@ -308,13 +404,46 @@ class PurchaseOrderLine(models.Model):
                             fiscal_position_id=False, date_planned=False,
                             name=False, price_unit=False, state='draftpo',
                             context=None):
-
+        """A caller that evaluates the same products again and again, like
+        the generation of the RFQs of many suppliers, can give a dictionary
+        in the onchange_product_memo key of the context. The results of the
+        core onchange are then kept in it for the duration of that call
+        only, so they never outlive a change of the products or prices.
+
+        The price is thrown away for RFQs and bids, so it is not computed
+        with the pricelist for them.
+        """
+        context = context or {}
         order_type = context.get('order_type') or 'rfq'
-
-        res = super(PurchaseOrderLine, self).onchange_product_id(
-            cr, uid, ids, pricelist_id, product_id, qty, uom_id, partner_id,
-            date_order, fiscal_position_id, date_planned, name, price_unit,
-            context=context)
+        price_discarded = ((state == 'draft' and order_type == 'rfq') or
+                           state in ('sent', 'draftbid', 'bid'))
+        if price_discarded:
+            pricelist_id = False
+
+        memo = context.get(ONCHANGE_MEMO_KEY)
+        key = None
+        if isinstance(memo, dict):
+            key = (uid, pricelist_id, product_id, qty, uom_id, partner_id,
+                   date_order, fiscal_position_id, date_planned, name,
+                   price_unit,
+                   tuple(sorted((k, v) for k, v in context.iteritems()
+                                if isinstance(v, MEMO_CONTEXT_TYPES))))
+            try:
+                hash(key)
+            except TypeError:
+                # unhashable argument
+                key = None
+        if key is not None and key in memo:
+            res = memo[key]
+        else:
+            res = super(PurchaseOrderLine, self).onchange_product_id(
+                cr, uid, ids, pricelist_id, product_id, qty, uom_id,
+                partner_id, date_order, fiscal_position_id, date_planned,
+                name, price_unit, context=context)
+            if key is not None:
+                memo[key] = res
+        # the callers are free to modify the result
+        res = copy.deepcopy(res)
 
         if state == 'draft' and order_type == 'rfq':
             res['value'].update({'price_unit': 0.0})
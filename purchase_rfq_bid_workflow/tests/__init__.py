@@ -1 +1,5 @@
 from . import test_consistent_type_and_state
+from . import test_concurrent_create
+from . import test_bid_expiry
+from . import test_chatter_queue
+from . import test_onchange_product_memo
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+#
+#
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+from datetime import timedelta
+
+from openerp import fields
+from openerp.tests import common
+
+
+class TestBidExpiry(common.TransactionCase):
+
+    def setUp(self):
+        super(TestBidExpiry, self).setUp()
+        partner = self.env.ref('base.res_partner_12')
+        today = fields.Date.from_string(
+            fields.Date.context_today(self.env.user))
+        PO = self.env['purchase.order'].with_context(draft_bid=True)
+        self.bids = {}
+        for key, days in (('expired', -1), ('expiring', 3), ('later', 30)):
+            self.bids[key] = PO.create({
+                'partner_id': partner.id,
+                'location_id': self.env.ref('stock.stock_location_stock').id,
+                'pricelist_id':
+                    partner.property_product_pricelist_purchase.id,
+                'bid_validity':
+                    fields.Date.to_string(today + timedelta(days=days)),
+            })
+
+    def test_expiring_bids(self):
+        expiring = self.env['purchase.order'].search_expiring_bids(days=7)
+        self.assertIn(self.bids['expiring'], expiring)
+        self.assertNotIn(self.bids['expired'], expiring)
+        self.assertNotIn(self.bids['later'], expiring)
+
+    def test_cancel_expired_bids(self):
+        self.assertEqual(self.bids['expired'].state, 'draftbid')
+        count = self.env['purchase.order'].cancel_expired_bids(batch_size=1)
+        self.assertGreaterEqual(count, 1)
+        self.assertEqual(self.bids['expired'].state, 'cancel')
+        self.assertEqual(
+            self.bids['expired'].cancel_reason_id,
+            self.env.ref('purchase_rfq_bid_workflow.'
+                         'purchase_cancel_reason_bid_validity_expired'))
+        self.assertEqual(self.bids['expiring'].state, 'draftbid')
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+#
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+from openerp.tests import common
+
+
+class TestChatterQueue(common.TransactionCase):
+
+    def setUp(self):
+        super(TestChatterQueue, self).setUp()
+        partner = self.env.ref('base.res_partner_12')
+        self.orders = self.env['purchase.order']
+        for __ in xrange(2):
+            self.orders |= self.orders.create({
+                'partner_id': partner.id,
+                'location_id': self.env.ref('stock.stock_location_stock').id,
+                'pricelist_id':
+                    partner.property_product_pricelist_purchase.id,
+            })
+        self.Queue = self.env['purchase.order.chatter.queue']
+
+    def canceled_messages(self, order):
+        return [body for body in order.message_ids.mapped('body')
+                if 'Request for Quotation canceled' in body]
+
+    def test_immediate(self):
+        self.orders.wkf_action_cancel()
+        for order in self.orders:
+            self.assertEqual(len(self.canceled_messages(order)), 1)
+        self.assertFalse(self.Queue.search(
+            [('order_id', 'in', self.orders.ids)]))
+
+    def test_deferred(self):
+        self.orders.with_context(defer_chatter=True).wkf_action_cancel()
+        queued = self.Queue.search([('order_id', 'in', self.orders.ids)])
+        self.assertEqual(len(queued), 2)
+        self.orders.invalidate_cache()
+        for order in self.orders:
+            self.assertFalse(self.canceled_messages(order))
+
+        self.Queue.flush_chatter_queue()
+        self.assertFalse(queued.exists())
+        self.orders.invalidate_cache()
+        for order in self.orders:
+            self.assertEqual(len(self.canceled_messages(order)), 1)
+
+    def test_flush_orders(self):
+        """ A mass operation posts the messages of its orders at its end
+        """
+        self.orders.with_context(defer_chatter=True).wkf_action_cancel()
+        self.assertEqual(self.orders[:1]._flush_chatter(), 1)
+        self.assertEqual(len(self.Queue.search(
+            [('order_id', 'in', self.orders.ids)])), 1)
+        self.orders.invalidate_cache()
+        self.assertEqual(len(self.canceled_messages(self.orders[0])), 1)
+        self.assertFalse(self.canceled_messages(self.orders[1]))
+
+    def test_param_needs_active_cron(self):
+        """ The system parameter only defers while the cron is active
+        """
+        self.env['ir.config_parameter'].set_param(
+            'purchase_rfq_bid_workflow.defer_chatter', 'True')
+        cron = self.env.ref(
+            'purchase_rfq_bid_workflow.ir_cron_flush_chatter_queue')
+        cron.active = False
+        self.orders[0].wkf_action_cancel()
+        self.assertFalse(self.Queue.search(
+            [('order_id', 'in', self.orders.ids)]))
+        cron.active = True
+        self.orders[1].wkf_action_cancel()
+        self.assertEqual(len(self.Queue.search(
+            [('order_id', 'in', self.orders.ids)])), 1)
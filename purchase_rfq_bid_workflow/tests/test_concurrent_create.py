@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+#
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+import threading
+
+from openerp import api
+from openerp.tests import common
+
+ORDERS_PER_THREAD = 10
+
+
+class TestConcurrentCreate(common.TransactionCase):
+    """RFQs and bids created at the same time in several threads are logged
+    with the name of their own kind of document"""
+
+    def setUp(self):
+        super(TestConcurrentCreate, self).setUp()
+        partner = self.env.ref('base.res_partner_12')
+        self.values = {
+            'partner_id': partner.id,
+            'location_id': self.env.ref('stock.stock_location_stock').id,
+            'pricelist_id': partner.property_product_pricelist_purchase.id,
+        }
+        self.errors = []
+
+    def create_orders(self, context, expected, prefix):
+        with api.Environment.manage():
+            cr = self.registry.cursor()
+            try:
+                env = api.Environment(cr, self.uid, context)
+                for index in xrange(ORDERS_PER_THREAD):
+                    values = dict(self.values,
+                                  name='%s-%s' % (prefix, index))
+                    order = env['purchase.order'].create(values)
+                    bodies = order.message_ids.mapped('body')
+                    if not any('%s created' % expected in body
+                               for body in bodies):
+                        self.errors.append((expected, bodies))
+            except Exception as e:
+                self.errors.append((expected, e))
+            finally:
+                cr.rollback()
+                cr.close()
+
+    def test_concurrent_create(self):
+        description = self.env['purchase.order']._description
+        threads = []
+        for context, expected in (({}, 'Request for Quotation'),
+                                  ({'draft_bid': True}, 'Draft Bid'),
+                                  ({'draft_po': True}, description)):
+            for __ in xrange(2):
+                prefix = 'concurrent-%d' % len(threads)
+                threads.append(threading.Thread(
+                    target=self.create_orders,
+                    args=(context, expected, prefix)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], self.errors)
+        self.assertEqual(description,
+                         self.env['purchase.order']._description)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+#
+#
+#    Copyright 2015 Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+from openerp.tests import common
+
+
+
+class TestOnchangeProductMemo(common.TransactionCase):
+
+    def setUp(self):
+        super(TestOnchangeProductMemo, self).setUp()
+        self.POL = self.registry('purchase.order.line')
+        self.partner = self.env.ref('base.res_partner_1')
+        self.product = self.env.ref('product.product_product_15')
+        self.pricelist = self.env.ref('purchase.list0')
+        self.memo = {}
+
+    def onchange(self, state, order_type, memo=None):
+        context = {'order_type': order_type}
+        if memo is not None:
+            context['onchange_product_memo'] = memo
+        return self.POL.onchange_product_id(
+            self.cr, self.uid, [], self.pricelist.id, self.product.id, 1.0,
+            self.product.uom_po_id.id, self.partner.id, state=state,
+            context=context)
+
+    def test_memoized(self):
+        """ The same onchange is computed once and its result is a copy
+        """
+        res = self.onchange('draftpo', 'purchase', memo=self.memo)
+        res['value']['name'] = 'changed'
+        res2 = self.onchange('draftpo', 'purchase', memo=self.memo)
+        self.assertNotEqual(res2['value']['name'], 'changed')
+        self.assertEqual(len(self.memo), 1)
+
+    def test_not_memoized_without_caller_memo(self):
+        """ Without a memo given by the caller, a change of the product is
+        seen by the next onchange
+        """
+        self.onchange('draftpo', 'purchase')
+        self.product.description_purchase = 'Changed description'
+        res = self.onchange('draftpo', 'purchase')
+        self.assertIn('Changed description', res['value']['name'])
+
+    def test_rfq_bypass(self):
+        """ The price of RFQs and bids is not computed with the pricelist
+        """
+        rfq = self.onchange('draft', 'rfq', memo=self.memo)
+        self.assertEqual(rfq['value']['price_unit'], 0.0)
+        bid = self.onchange('draftbid', 'bid', memo=self.memo)
+        self.assertNotIn('price_unit', bid['value'])
+        self.assertTrue(all(not key[1] for key in self.memo))